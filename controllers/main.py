@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import api, http, fields, _
+from odoo.exceptions import AccessError
+from odoo.http import request
+
+EXPORT_COLUMNS = [
+    'mo_name', 'mo_state', 'date_start', 'date_finished',
+    'finished_product', 'finished_lot',
+    'component_code', 'component_name', 'component_lot', 'qty', 'uom',
+]
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+class SimplifiedMrpExport(http.Controller):
+
+    @http.route('/aq_simplified_mrp/export/traceability', type='http', auth='user', methods=['GET'])
+    def export_traceability(self, date_from=None, date_to=None, fmt='csv', state=None, warehouse_id=None, **kw):
+        """
+        Exporta producciones y lotes consumidos en CSV o JSON lines, en
+        streaming: el generador abre su propio cursor (el de la peticion se
+        cierra al retornar) y lee las move lines por bloques.
+        """
+        if not request.env.user.has_group('aq_simplified_mrp.group_simplified_mrp_supervisor'):
+            raise AccessError(_('Solo supervisores pueden exportar la trazabilidad'))
+        if fmt not in EXPORT_FORMATS:
+            raise BadRequest(_('Formato no soportado: %s (use csv o jsonl)') % fmt)
+        if state and state not in request.env['mrp.production']._fields['state'].get_values(request.env):
+            raise BadRequest(_('Estado invalido: %s') % state)
+        filters = {
+            'date_from': _parse_datetime(date_from, 'date_from'),
+            'date_to': _parse_datetime(date_to, 'date_to'),
+            'state': state or None,
+            'warehouse_id': _parse_id(warehouse_id, 'warehouse_id'),
+        }
+        jsonl = fmt == 'jsonl'
+        registry = request.env.registry
+        uid = request.env.uid
+        context = dict(request.env.context, allowed_company_ids=request.env.companies.ids)
+
+        def generate():
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                api_model = env['aq.simplified.mrp.api']
+                if not jsonl:
+                    yield _csv_line(EXPORT_COLUMNS)
+                for rows in api_model._iter_traceability_chunks(**filters):
+                    if jsonl:
+                        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + '\n' for row in rows).encode()
+                    else:
+                        yield b''.join(_csv_line(row) for row in rows)
+
+        filename = 'trazabilidad_produccion.%s' % ('jsonl' if jsonl else 'csv')
+        return request.make_response(generate(), headers=[
+            ('Content-Type', 'application/x-ndjson' if jsonl else 'text/csv; charset=utf-8'),
+            ('Content-Disposition', 'attachment; filename="%s"' % filename),
+        ])
+
+
+def _parse_datetime(value, name):
+    if not value:
+        return None
+    try:
+        return fields.Datetime.to_datetime(value)
+    except ValueError:
+        raise BadRequest(_('%(name)s no es una fecha valida: %(value)s', name=name, value=value))
+
+
+def _parse_id(value, name):
+    if not value:
+        return None
+    if not str(value).isdigit():
+        raise BadRequest(_('%(name)s debe ser un id numerico: %(value)s', name=name, value=value))
+    return int(value)
+
+
+def _csv_line(values):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue().encode()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Pasa components_json / byproducts_json / assigned_lots_json de las sesiones
+borrador a las tablas de lineas y elimina las columnas JSON. Las sesiones
+confirmadas o canceladas no se migran (su contenido ya no se recupera).
+"""
+import json
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+JSON_COLUMNS = ('components_json', 'byproducts_json', 'assigned_lots_json')
+
+
+def _loads(raw, empty):
+    """JSON decodificado si tiene el tipo esperado (lista o dict); si no, `empty`."""
+    try:
+        value = json.loads(raw) if raw else empty
+    except (TypeError, ValueError):
+        return empty
+    return value if isinstance(value, type(empty)) else empty
+
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value):
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _lines(items):
+    """Lineas legibles: diccionarios con product_id entero."""
+    return [item for item in items if isinstance(item, dict) and _int(item.get('product_id')) > 0]
+
+
+def _lot_maps(lots):
+    """{product_id: {lot_id: qty}} con ids enteros; lot_id <= 0 es 'sin lote'."""
+    clean = {}
+    for pid, lot_map in lots.items():
+        if _int(pid) <= 0 or not isinstance(lot_map, dict):
+            continue
+        clean[_int(pid)] = {
+            _int(lid): _float(qty) for lid, qty in lot_map.items() if _int(lid, None) is not None
+        }
+    return clean
+
+
+def migrate(cr, version):
+    if not all(column_exists(cr, 'simplified_mrp_session', col) for col in JSON_COLUMNS):
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Session = env['simplified.mrp.session']
+
+    cr.execute("""
+        SELECT id, components_json, byproducts_json, assigned_lots_json
+          FROM simplified_mrp_session
+         WHERE state = 'draft'
+    """)
+    rows = [
+        (session_id, _lines(_loads(comps, [])), _lines(_loads(bps, [])), _lot_maps(_loads(lots, {})))
+        for session_id, comps, bps, lots in cr.fetchall()
+    ]
+    product_ids, lot_ids = set(), set()
+    for _sid, comps, bps, lots in rows:
+        product_ids.update(_int(c['product_id']) for c in comps + bps)
+        product_ids.update(lots)
+        lot_ids.update(lid for lot_map in lots.values() for lid in lot_map if lid > 0)
+    # Descartar referencias a registros ya eliminados
+    cr.execute("SELECT id FROM product_product WHERE id = ANY(%s)", [list(product_ids)])
+    product_ids = {row[0] for row in cr.fetchall()}
+    cr.execute("SELECT id FROM stock_lot WHERE id = ANY(%s)", [list(lot_ids)])
+    lot_ids = {row[0] for row in cr.fetchall()}
+
+    for session_id, comps, bps, lots in rows:
+        assigned = {
+            pid: {lid: qty for lid, qty in lot_map.items() if lid <= 0 or lid in lot_ids}
+            for pid, lot_map in lots.items() if pid in product_ids
+        }
+        session = Session.browse(session_id)
+        try:
+            with cr.savepoint():
+                vals = session._changed_vals({
+                    'components': [c for c in comps if _int(c['product_id']) in product_ids],
+                    'byproducts': [b for b in bps if _int(b['product_id']) in product_ids],
+                    'assigned_lots': assigned,
+                })
+                if vals:
+                    session.write(vals)
+        except Exception as e:
+            # Un borrador ilegible no debe impedir la actualizacion
+            _logger.warning("simplified.mrp.session %s: borrador no migrado: %s", session_id, e)
+    _logger.info("simplified.mrp.session: %s borradores migrados a lineas", len(rows))
+
+    cr.execute("""
+        ALTER TABLE simplified_mrp_session
+         DROP COLUMN components_json,
+         DROP COLUMN byproducts_json,
+         DROP COLUMN assigned_lots_json
+    """)
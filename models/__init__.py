@@ -1,3 +1,12 @@
 from . import simplified_mrp_api
 from . import simplified_mrp_session
-from . import res_config_settings
\ No newline at end of file
+from . import res_config_settings
+from . import product_product
+from . import mrp_bom
+from . import mrp_production
+from . import stock_location
+from . import simplified_mrp_completion_job
+from . import simplified_mrp_completion_attempt
+from . import simplified_mrp_perf
+from . import simplified_mrp_lot_counter
+from . import simplified_mrp_lot_genealogy
\ No newline at end of file
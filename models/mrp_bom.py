@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Campos de mrp.bom que cambian que variantes resuelven una BOM
+BOM_RESOLUTION_FIELDS = {'active', 'product_id', 'product_tmpl_id'}
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    def _smrp_affected_products(self):
+        """Variantes cuya resolucion de BOM depende de estas listas."""
+        products = self.env['product.product']
+        for bom in self.with_context(active_test=False):
+            if bom.product_id:
+                products |= bom.product_id
+            elif bom.product_tmpl_id:
+                products |= bom.product_tmpl_id.product_variant_ids
+        return products
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        boms = super().create(vals_list)
+        boms._smrp_affected_products()._smrp_refresh_has_bom()
+        self.env.registry.clear_cache()
+        return boms
+
+    def write(self, vals):
+        resolution_changed = bool(BOM_RESOLUTION_FIELDS.intersection(vals))
+        products = self._smrp_affected_products() if resolution_changed else None
+        res = super().write(vals)
+        if resolution_changed:
+            (products | self._smrp_affected_products())._smrp_refresh_has_bom()
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        products = self._smrp_affected_products()
+        res = super().unlink()
+        products._smrp_refresh_has_bom()
+        self.env.registry.clear_cache()
+        return res
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    # Los cambios en lineas invalidan las caches de resolucion/explosion de BOM
+    # en todos los workers (senalizacion de invalidacion del registry).
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return lines
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
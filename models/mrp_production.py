@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models
+
+_logger = logging.getLogger(__name__)
+
+
+class MrpProduction(models.Model):
+    _inherit = 'mrp.production'
+
+    def button_mark_done(self):
+        res = super().button_mark_done()
+        # Cubre cierres desde la UI estandar, los wizards y el flujo simplificado
+        done = self.filtered(lambda p: p.state == 'done' and p.lot_producing_id)
+        if done:
+            try:
+                with self.env.cr.savepoint():
+                    self.env['simplified.mrp.lot.genealogy'].sudo()._record_productions(done.ids)
+            except Exception as e:
+                _logger.warning("Genealogy for MOs %s not recorded: %s", done.ids, e)
+        return res
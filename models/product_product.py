@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+from odoo.tools.sql import create_index
+
+# Campos de product.product que cambian la resolucion de codigos escaneados
+PRODUCT_SCAN_FIELDS = {'barcode', 'default_code', 'active', 'product_tmpl_id'}
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    smrp_has_bom = fields.Boolean(
+        string='Tiene lista de materiales (MRP simplificado)',
+        help='Indica si existe una lista de materiales activa que resuelve para esta variante '
+             'en cualquier compania. Es solo un prefiltro de busqueda: la resolucion por '
+             'compania la hace el mapa de BOM del asistente.',
+        readonly=True,
+        copy=False,
+        index=True,
+        default=False,
+    )
+
+    def init(self):
+        # Poblar el indicador al instalar/actualizar; solo toca filas desalineadas
+        self._smrp_refresh_has_bom_sql()
+        # Busqueda por codigo parcial (ilike '%q%') y similitud; el nombre ya
+        # tiene indice trigram en product_template. Sin pg_trgm se usa el
+        # indice btree estandar de default_code.
+        if self.env.registry.has_trigram:
+            create_index(
+                self.env.cr, 'product_product_smrp_default_code_trgm_idx', self._table,
+                ['default_code gin_trgm_ops'], method='gin',
+            )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        # Una variante nueva puede heredar una BOM de plantilla existente
+        products._smrp_refresh_has_bom()
+        # Un codigo de barras o referencia nueva cambia la resolucion de escaneos
+        if any(vals.get('barcode') or vals.get('default_code') for vals in vals_list):
+            self.env.registry.clear_cache()
+        return products
+
+    def write(self, vals):
+        res = super().write(vals)
+        if PRODUCT_SCAN_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def _smrp_refresh_has_bom(self):
+        """Recalcula smrp_has_bom para estas variantes en una sola sentencia."""
+        if not self:
+            return
+        self.env['mrp.bom'].flush_model(['active', 'product_id', 'product_tmpl_id'])
+        self.flush_recordset(['product_tmpl_id'])
+        self._smrp_refresh_has_bom_sql(self.ids)
+        self.invalidate_recordset(['smrp_has_bom'])
+
+    def _smrp_refresh_has_bom_sql(self, product_ids=None):
+        query = """
+            UPDATE product_product pp
+               SET smrp_has_bom = sub.has_bom
+              FROM (
+                    SELECT p.id,
+                           EXISTS (
+                               SELECT 1
+                                 FROM mrp_bom b
+                                WHERE b.active
+                                  AND (b.product_id = p.id
+                                       OR (b.product_id IS NULL
+                                           AND b.product_tmpl_id = p.product_tmpl_id))
+                           ) AS has_bom
+                      FROM product_product p
+                     {where}
+                   ) sub
+             WHERE pp.id = sub.id
+               AND pp.smrp_has_bom IS DISTINCT FROM sub.has_bom
+        """
+        if product_ids is None:
+            self.env.cr.execute(query.format(where=''))
+        else:
+            self.env.cr.execute(query.format(where='WHERE p.id = ANY(%s)'), (list(product_ids),))
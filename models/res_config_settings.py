@@ -51,4 +51,32 @@ class ResConfigSettings(models.TransientModel):
         help='Guardar borrador automaticamente al cambiar de paso.',
         config_parameter='aq_simplified_mrp.autosave',
         default=True,
+    )
+    smrp_deferred_completion = fields.Boolean(
+        string='Cierre de ordenes en segundo plano',
+        help=(
+            'Si se activa, la orden se confirma y su cierre se encola para un proceso '
+            'programado; el operador no espera las estrategias de cierre.'
+        ),
+        config_parameter='aq_simplified_mrp.deferred_completion',
+        default=False,
+    )
+    smrp_perf_instrumentation = fields.Boolean(
+        string='Instrumentacion de rendimiento',
+        help='Registra tiempo y numero de consultas SQL por etapa de los endpoints principales.',
+        config_parameter='aq_simplified_mrp.perf_instrumentation',
+        default=False,
+    )
+    smrp_session_retention_days = fields.Integer(
+        string='Retencion de sesiones (dias)',
+        help='Las sesiones confirmadas o canceladas mas antiguas se depuran. 0 = conservar siempre.',
+        config_parameter='aq_simplified_mrp.session_retention_days',
+        default=90,
+    )
+    smrp_session_retention_mode = fields.Selection(
+        [('delete', 'Eliminar'), ('archive', 'Archivar')],
+        string='Depuracion de sesiones',
+        help='Eliminar borra la sesion y sus lineas; Archivar solo la oculta.',
+        config_parameter='aq_simplified_mrp.session_retention_mode',
+        default='delete',
     )
\ No newline at end of file
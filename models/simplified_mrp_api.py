@@ -1,13 +1,33 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL
+from .simplified_mrp_perf import PerfRecorder
 import logging
 from datetime import datetime
 import re
+import time
 
 _logger = logging.getLogger(__name__)
 
 LOT_PATTERN = re.compile(r'^[A-Za-z]{2}-\d{2}-\d{2}-\d{2}-\d{2}$')
+MAX_BOM_DEPTH = 50
+
+# Estrategias de cierre de MO, en el orden por defecto
+COMPLETION_STRATEGIES = [
+    'button_mark_done',
+    'double_button_mark_done',
+    'backorder_wizard',
+    'immediate',
+    'force_moves_done',
+    'sql_force_done',
+]
+STRATEGY_HISTORY_DAYS = 30
+STRATEGY_RELEARN_EVERY = 20
+
+
+class _ScanMiss(Exception):
+    """Codigo escaneado sin coincidencias (no se guarda en cache)."""
 
 
 class AqSimplifiedMrpApi(models.TransientModel):
@@ -17,6 +37,17 @@ class AqSimplifiedMrpApi(models.TransientModel):
     # ─── Config ────────────────────────────────────────────────────────────
     @api.model
     def get_mrp_config(self):
+        return dict(self._get_mrp_config_cached())
+
+    @api.model
+    @tools.ormcache()
+    def _get_mrp_config_cached(self):
+        """
+        Configuracion ya interpretada, una vez por base de datos. No requiere
+        invalidacion propia: crear, escribir o borrar un ir.config_parameter
+        (incluido ResConfigSettings.set_values) limpia la cache del registry
+        en todos los workers.
+        """
         param = self.env['ir.config_parameter'].sudo()
 
         def _bool(key, default='False'):
@@ -36,19 +67,99 @@ class AqSimplifiedMrpApi(models.TransientModel):
             'allow_confirm_red': _bool('aq_simplified_mrp.allow_confirm_red', 'True'),
             'auto_create_bom': _bool('aq_simplified_mrp.auto_create_bom', 'True'),
             'autosave': _bool('aq_simplified_mrp.autosave', 'True'),
+            'deferred_completion': _bool('aq_simplified_mrp.deferred_completion'),
+            'perf_instrumentation': _bool('aq_simplified_mrp.perf_instrumentation'),
         }
 
+    @api.model
+    def get_bootstrap_data(self, productions_limit=50):
+        """
+        Todo lo que el asistente necesita al abrir, en una sola llamada:
+        configuracion, borrador recuperable, almacenes y producciones recientes.
+        """
+        return {
+            'config': self.get_mrp_config(),
+            'session': self.env['simplified.mrp.session'].load_session(),
+            'warehouses': self.get_warehouses(),
+            'productions': self.get_my_productions_page(productions_limit),
+        }
+
+    # ─── Instrumentacion ───────────────────────────────────────────────────
+    @api.model
+    def _perf(self, endpoint):
+        return PerfRecorder(
+            self.env, endpoint, enabled=self._get_mrp_config_cached()['perf_instrumentation'],
+        )
+
+    @api.model
+    def get_perf_stats(self, endpoint=None, days=7):
+        """p50/p95/max de tiempo y consultas por etapa en los ultimos `days` dias."""
+        if not self.env.user.has_group('aq_simplified_mrp.group_simplified_mrp_supervisor'):
+            raise UserError(_('No tienes permiso para ver las estadisticas de rendimiento'))
+        return self.env['simplified.mrp.perf.sample'].sudo()._get_stats(endpoint=endpoint, days=days)
+
     # ─── Helpers ───────────────────────────────────────────────────────────
     @api.model
-    def _find_bom(self, product):
+    @tools.ormcache('company_ids')
+    def _get_bom_map(self, company_ids):
+        """
+        Mapa de resolucion de BOM (variante y plantilla -> bom_id) construido
+        con una sola consulta. Se invalida en todos los workers cuando cambia
+        cualquier mrp.bom o mrp.bom.line (ver models/mrp_bom.py).
+        """
+        # El contexto del primer llamador no debe colarse en la cache compartida
+        boms = self.env['mrp.bom'].sudo().with_context(active_test=True).search([
+            ('company_id', 'in', list(company_ids) + [False]),
+        ])
+        by_product = {}
+        by_template = {}
+        # Respeta el _order de mrp.bom: la primera BOM encontrada gana
+        for bom in boms:
+            if bom.product_id:
+                by_product.setdefault(bom.product_id.id, bom.id)
+            else:
+                by_template.setdefault(bom.product_tmpl_id.id, bom.id)
+        return {'product': by_product, 'template': by_template}
+
+    @api.model
+    def _find_boms(self, products):
+        """Resuelve la BOM de varias variantes a la vez; devuelve {product_id: mrp.bom}."""
+        bom_map = self._get_bom_map(tuple(sorted(self.env.companies.ids)))
+        bom_ids = {}
+        for product in products:
+            bom_ids[product.id] = (
+                bom_map['product'].get(product.id)
+                or bom_map['template'].get(product.product_tmpl_id.id)
+            )
+        # Prefetch compartido: leer lineas de una BOM trae las de todas
+        prefetch = tuple({bid for bid in bom_ids.values() if bid})
         Bom = self.env['mrp.bom']
-        bom = Bom.search([('product_id', '=', product.id)], limit=1)
-        if not bom:
-            bom = Bom.search([
-                ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                ('product_id', '=', False),
-            ], limit=1)
-        return bom
+        return {
+            pid: Bom.browse(bid).with_prefetch(prefetch) if bid else Bom
+            for pid, bid in bom_ids.items()
+        }
+
+    @api.model
+    def _find_bom(self, product):
+        return self._find_boms(product)[product.id]
+
+    @api.model
+    @tools.ormcache('warehouse_id')
+    def _get_internal_location_ids(self, warehouse_id):
+        """
+        Ubicaciones internas del almacen (prefijo de parent_path de su
+        ubicacion vista). Se invalida al cambiar stock.location o
+        stock.warehouse (ver models/stock_location.py).
+        """
+        wh = self.env['stock.warehouse'].sudo().browse(warehouse_id)
+        parent_path = wh.exists() and wh.view_location_id.parent_path
+        if not parent_path:
+            return ()
+        locs = self.env['stock.location'].sudo().search([
+            ('parent_path', '=like', parent_path + '%'),
+            ('usage', '=', 'internal'),
+        ])
+        return tuple(locs.ids)
 
     @api.model
     def _find_picking_type(self, warehouse):
@@ -129,6 +240,74 @@ class AqSimplifiedMrpApi(models.TransientModel):
                 'como subproducto de su propia lista de materiales.'
             ) % finished_product.display_name)
 
+    @api.model
+    def _collect_bom_graph(self, products):
+        """
+        Recorre por niveles todas las BOM alcanzables desde `products`.
+        Cada nivel se resuelve en bloque contra el mapa cacheado de BOM.
+        Retorna (graph, boms): graph {product_id: set(component_ids)} y
+        boms {product_id: mrp.bom} (vacio si el producto no tiene BOM).
+        """
+        Product = self.env['product.product']
+        graph = {}
+        boms = {}
+        frontier = products
+        while frontier:
+            found = self._find_boms(frontier)
+            next_ids = set()
+            for pid, bom in found.items():
+                boms[pid] = bom
+                graph[pid] = set(bom.bom_line_ids.product_id.ids) if bom else set()
+                next_ids |= graph[pid]
+            frontier = Product.browse(list(next_ids - set(graph)))
+        return graph, boms
+
+    @api.model
+    def _find_bom_cycle(self, graph):
+        """DFS iterativo sobre el grafo completo; retorna la ruta del ciclo o None."""
+        visiting, visited = set(), set()
+        for root in graph:
+            if root in visited:
+                continue
+            path = [root]
+            stack = [iter(graph.get(root, ()))]
+            visiting.add(root)
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    stack.pop()
+                    visited.add(path[-1])
+                    visiting.discard(path.pop())
+                    continue
+                if child in visiting:
+                    return path[path.index(child):] + [child]
+                if child not in visited:
+                    visiting.add(child)
+                    path.append(child)
+                    stack.append(iter(graph.get(child, ())))
+        return None
+
+    @api.model
+    def _raise_bom_cycle(self, cycle):
+        names = {p.id: p.display_name for p in self.env['product.product'].browse(list(set(cycle)))}
+        raise UserError(_(
+            'Configuracion invalida: ciclo en listas de materiales: %s'
+        ) % ' -> '.join(names.get(pid, str(pid)) for pid in cycle))
+
+    @api.model
+    def _validate_no_bom_cycle(self, finished_product, components):
+        """Detecta ciclos a cualquier profundidad al crear la BOM de finished_product."""
+        component_ids = {
+            int(c.get('product_id', 0))
+            for c in (components or [])
+            if c.get('product_id')
+        }
+        graph, _boms = self._collect_bom_graph(self.env['product.product'].browse(list(component_ids)))
+        graph[finished_product.id] = component_ids
+        cycle = self._find_bom_cycle(graph)
+        if cycle:
+            self._raise_bom_cycle(cycle)
+
     @api.model
     def _validate_bom_component_data(self, components):
         cleaned = []
@@ -185,44 +364,148 @@ class AqSimplifiedMrpApi(models.TransientModel):
         sos = self.env['sale.order'].search(domain, limit=int(limit), order='date_order desc, id desc')
         return [{'id': s.id, 'name': s.name} for s in sos]
 
+    @api.model
+    def prefill_from_sale_order(self, so_id, warehouse_id):
+        """
+        Prepara el asistente desde una orden de venta: lineas fabricables
+        (con BOM), BOM resueltas en lote, componentes escalados y primera
+        pagina de lotes de todos los componentes, en una sola respuesta.
+        """
+        if 'sale.order' not in self.env:
+            raise UserError(_('El modulo de Ventas no esta instalado'))
+        so = self.env['sale.order'].browse(int(so_id))
+        if not so.exists():
+            raise UserError(_('Orden de venta no encontrada'))
+        order_lines = so.order_line.filtered(
+            lambda l: not l.display_type and l.product_id.type in ('product', 'consu')
+        )
+        boms = self._find_boms(order_lines.product_id)
+
+        lines, skipped = [], []
+        component_ids = set()
+        for sol in order_lines:
+            product = sol.product_id
+            bom = boms.get(product.id)
+            if not bom:
+                skipped.append(product.display_name)
+                continue
+            qty = sol.product_uom._compute_quantity(sol.product_uom_qty, product.uom_id)
+            base = bom.product_qty or 1.0
+            comps = []
+            for bl in bom.bom_line_ids:
+                req_qty = (bl.product_qty * qty) / base
+                comps.append({
+                    'product_id': bl.product_id.id,
+                    'name': bl.product_id.display_name,
+                    'uom_id': bl.product_uom_id.id or bl.product_id.uom_id.id,
+                    'uom_name': bl.product_uom_id.name or bl.product_id.uom_id.name,
+                    'qty_formula': req_qty,
+                    'qty_real': req_qty,
+                    'tracking': bl.product_id.tracking,
+                })
+                if bl.product_id.tracking != 'none':
+                    component_ids.add(bl.product_id.id)
+            lines.append({
+                'sale_line_id': sol.id,
+                'product': {
+                    'id': product.id,
+                    'name': product.display_name,
+                    'uom_id': product.uom_id.id,
+                    'uom_name': product.uom_id.name,
+                    'tracking': product.tracking,
+                    'has_bom': True,
+                },
+                'qty': qty,
+                'bom_id': bom.id,
+                'components': comps,
+            })
+        return {
+            'sale_order': {'id': so.id, 'name': so.name},
+            'lines': lines,
+            'skipped': skipped,
+            'lots_by_product': self.get_lots_bulk(list(component_ids), warehouse_id) if warehouse_id else {},
+        }
+
     @api.model
     def get_stock_locations(self, warehouse_id):
         wh = self.env['stock.warehouse'].browse(int(warehouse_id))
         if not wh.exists():
             return []
         locs = self.env['stock.location'].search([
-            ('usage', '=', 'internal'),
-            ('location_id', 'child_of', wh.view_location_id.id),
+            ('id', 'in', self._get_internal_location_ids(wh.id)),
         ], order='name asc')
         return [{'id': l.id, 'name': l.display_name} for l in locs]
 
     @api.model
-    def get_finished_products(self, query='', limit=20, **kwargs):
+    def _search_products(self, query='', limit=20, role='component', only_with_bom=False):
+        """
+        Buscador comun de productos para los pasos de terminado, componentes
+        y subproductos (`role`: finished/component/byproduct). Filtra con
+        ilike sobre nombre y codigo (indices trigram) y ordena por relevancia:
+        codigo exacto, luego prefijo de codigo o nombre, luego similitud
+        (si pg_trgm esta disponible) y finalmente nombre.
+        """
+        Product = self.env['product.product']
         dom = [('type', 'in', ['product', 'consu'])]
-        if query and query.strip():
-            q = query.strip()
-            dom += ['|', ('name', 'ilike', q), ('default_code', 'ilike', q)]
-        prods = self.env['product.product'].search(dom, limit=int(limit), order='name asc')
-        result = []
-        for p in prods:
-            bom = self._find_bom(p)
-            result.append({
-                'id': p.id,
-                'name': p.display_name,
-                'uom_id': p.uom_id.id,
-                'uom_name': p.uom_id.name,
-                'tracking': p.tracking,
-                'has_bom': bool(bom),
-            })
-        return result
+        if role == 'finished' and only_with_bom:
+            # smrp_has_bom es un prefiltro indexado sin distincion de compania;
+            # el mapa cacheado de BOM (por compania) decide
+            bom_map = self._get_bom_map(tuple(sorted(self.env.companies.ids)))
+            dom += [
+                ('smrp_has_bom', '=', True),
+                '|', ('id', 'in', list(bom_map['product'])),
+                ('product_tmpl_id', 'in', list(bom_map['template'])),
+            ]
+        q = (query or '').strip()
+        if not q:
+            return Product.search(dom, limit=int(limit), order='name asc')
+        dom += ['|', ('name', 'ilike', q), ('default_code', 'ilike', q)]
+
+        search_query = Product._search(dom)
+        tmpl_alias = search_query.make_alias(Product._table, 'smrp_tmpl')
+        search_query.add_join('JOIN', tmpl_alias, 'product_template', SQL(
+            "%s = %s",
+            SQL.identifier(Product._table, 'product_tmpl_id'),
+            SQL.identifier(tmpl_alias, 'id'),
+        ))
+        code = SQL.identifier(Product._table, 'default_code')
+        name = self.env['product.template']._field_to_sql(tmpl_alias, 'name', search_query)
+        prefix = re.sub(r'([%_\\])', r'\\\1', q) + '%'
+        order = [SQL(
+            "CASE WHEN lower(%(code)s) = lower(%(q)s) THEN 0"
+            " WHEN %(code)s ILIKE %(prefix)s OR %(name)s ILIKE %(prefix)s THEN 1"
+            " ELSE 2 END",
+            code=code, name=name, q=q, prefix=prefix,
+        )]
+        if self.env.registry.has_trigram:
+            order.append(SQL(
+                "GREATEST(similarity(COALESCE(%(code)s, ''), %(q)s), similarity(%(name)s, %(q)s)) DESC",
+                code=code, name=name, q=q,
+            ))
+        order += [name, SQL.identifier(Product._table, 'id')]
+        search_query.order = SQL(', ').join(order)
+        search_query.limit = int(limit)
+        return Product.browse(list(search_query))
+
+    @api.model
+    def get_finished_products(self, query='', limit=20, only_with_bom=False, **kwargs):
+        with self._perf('get_finished_products') as perf:
+            with perf.stage('search'):
+                prods = self._search_products(query, limit, role='finished', only_with_bom=only_with_bom)
+            with perf.stage('read'):
+                boms = self._find_boms(prods)
+                return [{
+                    'id': p.id,
+                    'name': p.display_name,
+                    'uom_id': p.uom_id.id,
+                    'uom_name': p.uom_id.name,
+                    'tracking': p.tracking,
+                    'has_bom': bool(boms[p.id]),
+                } for p in prods]
 
     @api.model
     def search_components(self, query='', limit=20, **kwargs):
-        dom = [('type', 'in', ['product', 'consu'])]
-        if query and query.strip():
-            q = query.strip()
-            dom += ['|', ('name', 'ilike', q), ('default_code', 'ilike', q)]
-        prods = self.env['product.product'].search(dom, limit=int(limit), order='name asc')
+        prods = self._search_products(query, limit, role='component')
         return [{
             'id': p.id,
             'name': p.display_name,
@@ -233,11 +516,7 @@ class AqSimplifiedMrpApi(models.TransientModel):
 
     @api.model
     def search_byproducts(self, query='', limit=20):
-        dom = [('type', 'in', ['product', 'consu'])]
-        if query and query.strip():
-            q = query.strip()
-            dom += ['|', ('name', 'ilike', q), ('default_code', 'ilike', q)]
-        prods = self.env['product.product'].search(dom, limit=int(limit), order='name asc')
+        prods = self._search_products(query, limit, role='byproduct')
         return [{
             'id': p.id,
             'name': p.display_name,
@@ -268,50 +547,402 @@ class AqSimplifiedMrpApi(models.TransientModel):
             })
         return {'bom_id': bom.id, 'bom_exists': True, 'components': comps}
 
+    @api.model
+    def explode_bom(self, product_id, qty=1.0, levels=0):
+        """
+        Explosion multinivel: expande sub-ensambles con BOM hasta `levels`
+        niveles (0 = hasta MAX_BOM_DEPTH) y agrega cantidades por componente
+        hoja en la UdM del componente. Los sub-BOM compartidos se calculan una
+        sola vez por llamada y los ciclos se detectan sobre todo el grafo.
+        `truncated` indica si el limite de niveles corto alguna expansion.
+        """
+        product = self.env['product.product'].browse(int(product_id))
+        if not product.exists():
+            raise UserError(_('Producto no encontrado'))
+        graph, boms = self._collect_bom_graph(product)
+        root_bom = boms.get(product.id)
+        if not root_bom:
+            return {'bom_id': False, 'bom_exists': False, 'components': [], 'levels': 0, 'truncated': False}
+        cycle = self._find_bom_cycle(graph)
+        if cycle:
+            self._raise_bom_cycle(cycle)
+
+        max_depth = int(levels or 0) or MAX_BOM_DEPTH
+        # product_id -> (totals, altura del sub-arbol); solo sub-arboles
+        # expandidos completos, validos en cualquier nivel donde quepan
+        memo = {}
+        depth_reached = [1]
+        truncated = [False]
+
+        def _per_unit(prod, depth):
+            # ({component_id: qty por 1 unidad de prod (UdM del producto)}, altura, truncado)
+            cached = memo.get(prod.id)
+            if cached and depth + cached[1] - 1 <= max_depth:
+                depth_reached[0] = max(depth_reached[0], depth + cached[1] - 1)
+                return cached[0], cached[1], False
+            depth_reached[0] = max(depth_reached[0], depth)
+            bom = boms[prod.id]
+            base = bom.product_uom_id._compute_quantity(
+                bom.product_qty or 1.0, prod.uom_id, round=False
+            ) if bom.product_uom_id else (bom.product_qty or 1.0)
+            totals = {}
+            height = 1
+            cut = False
+            for line in bom.bom_line_ids:
+                comp = line.product_id
+                line_qty = line.product_uom_id._compute_quantity(
+                    line.product_qty, comp.uom_id, round=False
+                ) / base
+                if boms.get(comp.id) and depth < max_depth:
+                    sub_totals, sub_height, sub_cut = _per_unit(comp, depth + 1)
+                    height = max(height, sub_height + 1)
+                    cut = cut or sub_cut
+                    for sub_id, sub_qty in sub_totals.items():
+                        totals[sub_id] = totals.get(sub_id, 0.0) + sub_qty * line_qty
+                else:
+                    # Un sub-ensamble con BOM queda como hoja al alcanzar el limite
+                    cut = cut or bool(boms.get(comp.id))
+                    totals[comp.id] = totals.get(comp.id, 0.0) + line_qty
+            if cut:
+                truncated[0] = True
+            else:
+                memo[prod.id] = (totals, height)
+            return totals, height, cut
+
+        totals = _per_unit(product, 1)[0]
+        if truncated[0] and not levels:
+            _logger.warning(
+                "explode_bom: BOM de %s truncada en %s niveles (MAX_BOM_DEPTH)",
+                product.display_name, MAX_BOM_DEPTH,
+            )
+        comps = []
+        for comp in self.env['product.product'].browse(list(totals)):
+            req_qty = totals[comp.id] * float(qty)
+            comps.append({
+                'product_id': comp.id,
+                'name': comp.display_name,
+                'uom_id': comp.uom_id.id,
+                'uom_name': comp.uom_id.name,
+                'qty_formula': req_qty,
+                'qty_real': req_qty,
+                'tracking': comp.tracking,
+            })
+        return {
+            'bom_id': root_bom.id,
+            'bom_exists': True,
+            'components': comps,
+            'levels': depth_reached[0],
+            # Sub-ensambles con BOM que quedaron como hoja por el limite de niveles
+            'truncated': truncated[0],
+        }
+
     @api.model
     def get_lots(self, product_id, warehouse_id, limit=60, query=''):
+        return self.get_lots_page(product_id, warehouse_id, limit=limit, query=query)['lots']
+
+    @api.model
+    def get_lots_page(self, product_id, warehouse_id, limit=60, query='', cursor=None):
+        """
+        Disponibilidad por lote paginada por cursor (keyset sobre nombre de
+        lote e id). Retorna {'lots': [...], 'next_cursor': dict o False}.
+        """
         product = self.env['product.product'].browse(int(product_id))
         wh = self.env['stock.warehouse'].browse(int(warehouse_id))
-        if not product.exists() or not wh.exists():
-            return []
-        view_loc = wh.view_location_id
-        if not view_loc:
-            return []
-        Quant = self.env['stock.quant'].sudo()
-        internal_locs = self.env['stock.location'].search([
-            ('location_id', 'child_of', view_loc.id),
-            ('usage', '=', 'internal'),
-        ])
-        domain = [
-            ('product_id', '=', product.id),
-            ('location_id', 'in', internal_locs.ids),
-            ('quantity', '>', 0),
+        if not product.exists() or not wh.exists() or not wh.view_location_id:
+            return {'lots': [], 'next_cursor': False}
+        with self._perf('get_lots') as perf:
+            with perf.stage('locations'):
+                location_ids = self._get_internal_location_ids(wh.id)
+            with perf.stage('aggregate'):
+                return self._query_lot_availability(
+                    [product.id], location_ids, limit=int(limit), query=query, cursor=cursor,
+                )[product.id]
+
+    @api.model
+    def get_lots_bulk(self, product_ids, warehouse_id, limit=60):
+        """
+        Primera pagina de disponibilidad por lote para varios componentes en
+        una sola consulta. Retorna {product_id: {'lots', 'next_cursor'}}.
+        """
+        wh = self.env['stock.warehouse'].browse(int(warehouse_id))
+        pids = [int(pid) for pid in (product_ids or []) if pid]
+        if not pids or not wh.exists() or not wh.view_location_id:
+            return {}
+        return self._query_lot_availability(
+            pids, self._get_internal_location_ids(wh.id), limit=int(limit),
+        )
+
+    @api.model
+    def _query_lot_availability(self, product_ids, location_ids, limit=60, query='', cursor=None):
+        """
+        Agrega quants por producto y lote en una sola consulta: el filtro de
+        disponibilidad, el orden (nombre de lote, sin lote al final) y el
+        limite por producto se resuelven en la base de datos.
+        El cursor solo aplica cuando se consulta un unico producto.
+        Retorna {product_id: {'lots': [...], 'next_cursor': dict o False}}.
+        """
+        result = {pid: {'lots': [], 'next_cursor': False} for pid in product_ids}
+        if not product_ids or not location_ids:
+            return result
+        if cursor and cursor.get('name') is None:
+            # La pagina anterior termino en la fila "sin lote": no hay mas
+            return result
+        self.env['stock.quant'].flush_model(
+            ['product_id', 'location_id', 'lot_id', 'quantity', 'reserved_quantity']
+        )
+        self.env['stock.lot'].flush_model(['name'])
+
+        where = [
+            'q.product_id = ANY(%s)',
+            'q.location_id = ANY(%s)',
+            'q.quantity > 0',
         ]
+        params = [list(product_ids), list(location_ids)]
         if query and query.strip():
-            matching_lots = self.env['stock.lot'].search([
-                ('product_id', '=', product.id),
-                ('name', 'ilike', query.strip()),
-            ])
-            domain.append(('lot_id', 'in', matching_lots.ids))
-        quants = Quant.search(domain, limit=int(limit) * 10)
-        lot_totals = {}
-        for q in quants:
-            lot_key = q.lot_id.id if q.lot_id else False
-            if lot_key not in lot_totals:
-                lot_totals[lot_key] = {
-                    'id': lot_key or -1,
-                    'name': q.lot_id.name if q.lot_id else _('Sin lote / General'),
-                    'qty': 0.0, 'reserved': 0.0,
-                }
-            lot_totals[lot_key]['qty'] += q.quantity
-            lot_totals[lot_key]['reserved'] += q.reserved_quantity
-        out = []
-        for data in lot_totals.values():
-            available = data['qty'] - data['reserved']
-            if available > 0:
-                out.append({'id': data['id'], 'name': data['name'], 'qty_available': round(available, 4)})
-        out.sort(key=lambda x: x['name'] or 'ZZZZ')
-        return out[:int(limit)]
+            where.append('l.name ILIKE %s')
+            params.append('%%%s%%' % query.strip())
+        if cursor:
+            where.append('(l.name > %s OR (l.name = %s AND q.lot_id > %s) OR l.name IS NULL)')
+            params += [cursor['name'], cursor['name'], int(cursor.get('lot_id') or 0)]
+        params.append(limit + 1)
+
+        self.env.cr.execute("""
+            SELECT product_id, lot_id, lot_name, available
+              FROM (
+                    SELECT q.product_id, q.lot_id, l.name AS lot_name,
+                           SUM(q.quantity) - SUM(q.reserved_quantity) AS available,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY q.product_id
+                               ORDER BY l.name ASC NULLS LAST, q.lot_id
+                           ) AS rn
+                      FROM stock_quant q
+                      LEFT JOIN stock_lot l ON l.id = q.lot_id
+                     WHERE {where}
+                  GROUP BY q.product_id, q.lot_id, l.name
+                    HAVING SUM(q.quantity) - SUM(q.reserved_quantity) > 0
+                   ) agg
+             WHERE rn <= %s
+          ORDER BY product_id, rn
+        """.format(where=' AND '.join(where)), params)
+
+        for product_id, lot_id, lot_name, available in self.env.cr.fetchall():
+            page = result[product_id]
+            if len(page['lots']) >= limit:
+                # Hay mas filas: la fila "sin lote" siempre va al final, asi
+                # que la ultima fila de la pagina es un lote real
+                last = page['lots'][-1]
+                page['next_cursor'] = {'name': last['name'], 'lot_id': last['id']}
+                continue
+            page['lots'].append({
+                'id': lot_id or -1,
+                'name': lot_name if lot_id else _('Sin lote / General'),
+                'qty_available': round(available, 4),
+            })
+        return result
+
+    # ─── Escaneo ───────────────────────────────────────────────────────────
+    @api.model
+    def resolve_scan(self, code, warehouse_id, context_step=''):
+        """
+        Resuelve un codigo escaneado por igualdad exacta contra codigo de
+        barras, referencia interna y nombre de lote, con su disponibilidad en
+        el almacen. En el paso de lotes se prefieren coincidencias de lote;
+        en los demas, de producto. Retorna {'found', 'code', 'match',
+        'matches'}.
+        """
+        code = (code or '').strip()
+        if not code:
+            return {'found': False, 'code': code, 'match': False, 'matches': []}
+        company_ids = tuple(sorted(self.env.companies.ids))
+        # Los nombres de lote no son unicos entre productos: siempre en vivo
+        hits = self._query_lot_scan_hits(code, company_ids)
+        try:
+            hits += self._get_product_scan_hits(code, company_ids)
+        except _ScanMiss:
+            pass
+
+        lots_first = context_step == 'lots'
+        hits = sorted(hits, key=lambda h: (h[0] != 'lot') if lots_first else (h[0] == 'lot'))
+        products = self.env['product.product'].browse([h[1] for h in hits]).exists()
+        lots = self.env['stock.lot'].browse([h[2] for h in hits if h[2]]).exists()
+        hits = [h for h in hits if h[1] in products.ids and (not h[2] or h[2] in lots.ids)]
+
+        available, totals = {}, {}
+        location_ids = self._get_internal_location_ids(int(warehouse_id)) if warehouse_id else ()
+        if hits and location_ids:
+            self.env['stock.quant'].flush_model(['product_id', 'lot_id', 'location_id', 'quantity', 'reserved_quantity'])
+            self.env.cr.execute("""
+                SELECT product_id, lot_id, SUM(quantity) - SUM(reserved_quantity)
+                  FROM stock_quant
+                 WHERE product_id = ANY(%s) AND location_id = ANY(%s)
+              GROUP BY product_id, lot_id
+            """, (list({h[1] for h in hits}), list(location_ids)))
+            for product_id, lot_id, qty in self.env.cr.fetchall():
+                available[(product_id, lot_id)] = qty or 0.0
+                totals[product_id] = totals.get(product_id, 0.0) + (qty or 0.0)
+
+        matches = []
+        for kind, product_id, lot_id in hits:
+            product = products.browse(product_id)
+            lot = lots.browse(lot_id) if lot_id else False
+            matches.append({
+                'kind': kind,
+                'product': {
+                    'id': product.id,
+                    'name': product.display_name,
+                    'uom_id': product.uom_id.id,
+                    'uom_name': product.uom_id.name,
+                    'tracking': product.tracking,
+                },
+                'lot': {'id': lot.id, 'name': lot.name} if lot else False,
+                'qty_available': round(
+                    available.get((product_id, lot_id), 0.0) if lot_id else totals.get(product_id, 0.0), 4,
+                ),
+            })
+        return {
+            'found': bool(matches),
+            'code': code,
+            'match': matches[0] if matches else False,
+            'matches': matches,
+        }
+
+    @api.model
+    def _query_lot_scan_hits(self, code, company_ids):
+        """Lotes con nombre exacto `code` (indice de stock_lot.name), sin cache."""
+        self.env['stock.lot'].flush_model(['name', 'product_id', 'company_id'])
+        self.env.cr.execute("""
+            SELECT 'lot', l.product_id, l.id
+              FROM stock_lot l
+             WHERE l.name = %(code)s
+               AND (l.company_id IS NULL OR l.company_id = ANY(%(companies)s))
+             LIMIT 20
+        """, {'code': code, 'companies': list(company_ids)})
+        return [tuple(row) for row in self.env.cr.fetchall()]
+
+    @api.model
+    @tools.ormcache('code', 'company_ids')
+    def _get_product_scan_hits(self, code, company_ids):
+        """
+        Productos cuyo codigo de barras o referencia interna es `code`. Un
+        codigo sin coincidencias lanza _ScanMiss para que ormcache no lo
+        guarde. Crear un producto o cambiar su codigo limpia la cache en
+        todos los workers (product_product.py).
+        """
+        self.env['product.product'].flush_model(['barcode', 'default_code', 'active'])
+        self.env.cr.execute("""
+            SELECT 'product', p.id, NULL
+              FROM product_product p
+              JOIN product_template t ON t.id = p.product_tmpl_id
+             WHERE p.barcode = %(code)s AND p.active
+               AND (t.company_id IS NULL OR t.company_id = ANY(%(companies)s))
+            UNION ALL
+            SELECT 'product', p.id, NULL
+              FROM product_product p
+              JOIN product_template t ON t.id = p.product_tmpl_id
+             WHERE p.default_code = %(code)s AND p.active
+               AND (p.barcode IS NULL OR p.barcode != %(code)s)
+               AND (t.company_id IS NULL OR t.company_id = ANY(%(companies)s))
+             LIMIT 20
+        """, {'code': code, 'companies': list(company_ids)})
+        hits = [tuple(row) for row in self.env.cr.fetchall()]
+        if not hits:
+            raise _ScanMiss()
+        return tuple(hits)
+
+    # ─── Asignacion automatica de lotes ────────────────────────────────────
+    @api.model
+    def auto_allocate_lots(self, warehouse_id, components, policy='fefo'):
+        """
+        Propone el reparto por lote de todos los componentes de una vez.
+        `components`: [{'product_id', 'qty_real'}]. `policy`:
+          - fefo: primero el lote que caduca antes (expiration_date si existe)
+          - fifo: primero el lote con entrada mas antigua
+          - fewest: el menor lote que cubre todo, o los mas grandes primero
+        Usa la disponibilidad agregada de quants (cantidad menos reservado).
+        Retorna {'assigned_lots': {product_id: {lot_id: qty}}, 'lots':
+        {product_id: [lotes usados]}, 'shortages': {product_id: faltante}}.
+        """
+        wh = self.env['stock.warehouse'].browse(int(warehouse_id))
+        needs = {}
+        for comp in components or []:
+            pid = int(comp.get('product_id') or 0)
+            qty = float(comp.get('qty_real', comp.get('qty')) or 0.0)
+            if pid and qty > 0:
+                needs[pid] = needs.get(pid, 0.0) + qty
+        result = {'assigned_lots': {}, 'lots': {}, 'shortages': {}}
+        if not needs or not wh.exists():
+            return result
+        location_ids = self._get_internal_location_ids(wh.id)
+        products = self.env['product.product'].browse(list(needs))
+
+        candidates = {pid: [] for pid in needs}
+        if location_ids:
+            has_expiry = 'expiration_date' in self.env['stock.lot']._fields
+            self.env['stock.quant'].flush_model(['product_id', 'lot_id', 'location_id', 'quantity', 'reserved_quantity', 'in_date'])
+            self.env['stock.lot'].flush_model(['name'] + (['expiration_date'] if has_expiry else []))
+            self.env.cr.execute("""
+                SELECT q.product_id, q.lot_id, l.name, MIN(q.in_date),
+                       {expiry},
+                       SUM(q.quantity) - SUM(q.reserved_quantity) AS available
+                  FROM stock_quant q
+                  LEFT JOIN stock_lot l ON l.id = q.lot_id
+                 WHERE q.product_id = ANY(%s) AND q.location_id = ANY(%s)
+              GROUP BY q.product_id, q.lot_id, l.name{group_expiry}
+                HAVING SUM(q.quantity) - SUM(q.reserved_quantity) > 0
+            """.format(
+                expiry='l.expiration_date' if has_expiry else 'NULL::timestamp',
+                group_expiry=', l.expiration_date' if has_expiry else '',
+            ), (list(needs), list(location_ids)))
+            for pid, lot_id, lot_name, in_date, expiry, available in self.env.cr.fetchall():
+                candidates[pid].append({
+                    'id': lot_id or -1, 'name': lot_name, 'in_date': in_date,
+                    'expiry': expiry, 'available': available,
+                })
+
+        far = datetime.max
+        for product in products:
+            lots = candidates[product.id]
+            need = needs[product.id]
+            tracked = product.tracking != 'none'
+
+            def untracked_last(lot):
+                # La fila "sin lote" siempre al final para productos con seguimiento
+                return tracked and lot['id'] == -1
+
+            if policy == 'fewest':
+                covering = [lot for lot in lots if lot['available'] >= need and not untracked_last(lot)]
+                if covering:
+                    lots = [min(covering, key=lambda lot: lot['available'])]
+                else:
+                    lots.sort(key=lambda lot: (untracked_last(lot), -lot['available']))
+            elif policy == 'fifo':
+                lots.sort(key=lambda lot: (untracked_last(lot), lot['in_date'] or far, lot['name'] or ''))
+            else:
+                lots.sort(key=lambda lot: (
+                    untracked_last(lot), lot['expiry'] or far, lot['in_date'] or far, lot['name'] or '',
+                ))
+
+            rounding = product.uom_id.rounding
+            assigned, used = {}, []
+            remaining = need
+            for lot in lots:
+                if tools.float_compare(remaining, 0.0, precision_rounding=rounding) <= 0:
+                    break
+                take = tools.float_round(min(lot['available'], remaining), precision_rounding=rounding)
+                if take <= 0:
+                    continue
+                assigned[lot['id']] = take
+                used.append({
+                    'id': lot['id'],
+                    'name': lot['name'] if lot['id'] != -1 else _('Sin lote / General'),
+                    'qty_available': round(lot['available'], 4),
+                })
+                remaining -= take
+            result['assigned_lots'][product.id] = assigned
+            result['lots'][product.id] = used
+            if tools.float_compare(remaining, 0.0, precision_rounding=rounding) > 0:
+                result['shortages'][product.id] = tools.float_round(remaining, precision_rounding=rounding)
+        return result
 
     # ─── Validar lote manual ───────────────────────────────────────────────
     @api.model
@@ -345,6 +976,7 @@ class AqSimplifiedMrpApi(models.TransientModel):
                 'message': _('Ya existe una lista de materiales para este producto.'),
             }
         self._validate_no_direct_cycle(product, components, byproducts)
+        self._validate_no_bom_cycle(product, components)
         cleaned_components = self._validate_bom_component_data(components)
         cleaned_byproducts = self._validate_bom_byproduct_data(byproducts)
         if not cleaned_components:
@@ -470,7 +1102,7 @@ class AqSimplifiedMrpApi(models.TransientModel):
         return errors
 
     @api.model
-    def _complete_mo_robust(self, mo, product, qty, finished_lot):
+    def _complete_mo_robust(self, mo, product, qty, finished_lot, perf=None):
         """
         Intenta completar la MO usando múltiples estrategias.
         
@@ -478,6 +1110,10 @@ class AqSimplifiedMrpApi(models.TransientModel):
         Para pasar a 'done' se necesita llamar button_mark_done() DE NUEVO
         cuando la MO está en 'to_close', o usar el backorder wizard con
         action_close_mo().
+
+        Las estrategias se prueban en el orden de exito observado para la
+        compania y el tipo de rastreo del producto (ver
+        _get_strategy_order); cada intento queda registrado.
         
         Retorna dict con:
           - completed: bool
@@ -493,243 +1129,340 @@ class AqSimplifiedMrpApi(models.TransientModel):
             for pe in prep_errors:
                 _logger.warning("Prep warning: %s", pe)
 
-        # ─── Helper: check if done after each attempt ──────────────
-        def _is_done():
-            mo.invalidate_recordset()
-            return mo.state == 'done'
+        perf = perf or PerfRecorder(self.env, 'complete_mo', enabled=False)
+        attempted = set()
+        attempt_vals = []
+        strategy_used = False
+        order, relearn = self._get_strategy_order(mo.company_id, product.tracking)
+        for strategy in order:
+            started = time.monotonic()
+            with perf.stage('strategy.%s' % strategy):
+                outcome = getattr(self, '_strategy_%s' % strategy)(mo, errors_log, attempted)
+            if outcome is None:
+                # No aplicaba al estado actual de la MO: no cuenta como intento
+                continue
+            # La estrategia doble puede cerrar la MO con la primera llamada (o
+            # su wizard): el exito se atribuye a la estrategia que lo logro
+            if outcome and outcome.split('+')[0] in COMPLETION_STRATEGIES:
+                strategy = outcome.split('+')[0]
+            attempted.add(strategy)
+            attempt_vals.append({
+                'strategy': strategy,
+                'strategy_detail': outcome or '',
+                'success': bool(outcome),
+                'duration_ms': (time.monotonic() - started) * 1000.0,
+                'tracking': product.tracking or 'none',
+                'company_id': mo.company_id.id,
+                'production_id': mo.id,
+                'relearn': relearn,
+            })
+            if outcome:
+                strategy_used = outcome
+                break
+        self._record_strategy_attempts(attempt_vals)
+
+        if strategy_used:
+            if strategy_used in ('force_moves_done', 'sql_force_done'):
+                # Cierres sin button_mark_done: el hook de mrp.production no corre
+                self._record_genealogy(mo)
+            return {
+                'completed': True, 'state': 'done',
+                'error_detail': '', 'strategy_used': strategy_used,
+            }
+
+        # ─── Ninguna estrategia funcionó ───────────────────────────
+        mo.invalidate_recordset()
+        error_summary = " | ".join(errors_log[-5:])
+        _logger.error(
+            "MO %s (ID %s) no pudo completarse. Estado final: %s. Errores: %s",
+            mo.name, mo.id, mo.state, error_summary
+        )
+        return {
+            'completed': False,
+            'state': mo.state,
+            'error_detail': error_summary,
+            'strategy_used': 'none',
+        }
+
+    # ─── Estrategias de cierre ─────────────────────────────────────────────
+    # Cada estrategia retorna el nombre detallado si completo la MO, False si
+    # se intento y fallo, o None si no aplicaba al estado actual.
+
+    @api.model
+    def _get_strategy_order(self, company, tracking):
+        """
+        Ordena las estrategias por tasa de exito observada (suavizada) en la
+        ventana reciente. Tras STRATEGY_RELEARN_EVERY cierres (MOs distintas)
+        desde el ultimo re-aprendizaje se usa el orden completo por defecto
+        para poder re-aprender tras actualizaciones. Retorna (orden, relearn);
+        los intentos de un cierre con relearn se marcan para contar desde ahi.
+        """
+        Attempt = self.env['simplified.mrp.completion.attempt'].sudo()
+        scope = [('company_id', '=', company.id), ('tracking', '=', tracking or 'none')]
+        since = fields.Datetime.subtract(fields.Datetime.now(), days=STRATEGY_HISTORY_DAYS)
+        groups = Attempt._read_group(
+            scope + [('create_date', '>=', since)],
+            ['strategy', 'success'], ['__count'],
+        )
+        if not groups:
+            return list(COMPLETION_STRATEGIES), False
+        last_relearn = Attempt.search(scope + [('relearn', '=', True)], limit=1)
+        [(completions,)] = Attempt._read_group(
+            scope + ([('id', '>', last_relearn.id)] if last_relearn else []),
+            [], ['production_id:count_distinct'],
+        )
+        if completions >= STRATEGY_RELEARN_EVERY:
+            return list(COMPLETION_STRATEGIES), True
+
+        stats = {}
+        for strategy, success, count in groups:
+            tried, won = stats.get(strategy, (0, 0))
+            stats[strategy] = (tried + count, won + (count if success else 0))
+
+        def _rate(strategy):
+            tried, won = stats.get(strategy, (0, 0))
+            return (won + 1.0) / (tried + 2.0)
+
+        # Solo suben las estrategias con exitos registrados; las demas quedan
+        # detras en el orden por defecto, asi un fallo aislado del cierre
+        # estandar nunca adelanta a force_moves_done o sql_force_done
+        winners = [st for st in COMPLETION_STRATEGIES if stats.get(st, (0, 0))[1]]
+        winners.sort(key=lambda st: (-_rate(st), COMPLETION_STRATEGIES.index(st)))
+        order = winners + [st for st in COMPLETION_STRATEGIES if st not in winners]
+        return order, False
+
+    @api.model
+    def _record_strategy_attempts(self, attempt_vals):
+        if not attempt_vals:
+            return
+        try:
+            with self.env.cr.savepoint():
+                self.env['simplified.mrp.completion.attempt'].sudo().create(attempt_vals)
+        except Exception as e:
+            _logger.warning("No se pudo registrar el historial de estrategias: %s", e)
+
+    @api.model
+    def _mo_is_done(self, mo):
+        mo.invalidate_recordset()
+        return mo.state == 'done'
+
+    @api.model
+    def _record_genealogy(self, mo):
+        try:
+            with self.env.cr.savepoint():
+                self.env['simplified.mrp.lot.genealogy'].sudo()._record_productions(mo.ids)
+        except Exception as e:
+            _logger.warning("Genealogy for MO %s not recorded: %s", mo.name, e)
 
+    @api.model
+    def _run_mark_done_wizard(self, mo, action, prefix, errors_log, label):
+        """button_mark_done puede devolver un wizard action dict: ejecutarlo."""
+        if not (isinstance(action, dict) and action.get('res_model')):
+            return False
+        try:
+            wiz_model = action['res_model']
+            wiz_id = action.get('res_id')
+            ctx = action.get('context', {})
+            if wiz_id:
+                wiz = self.env[wiz_model].with_context(**ctx).browse(wiz_id)
+            else:
+                wiz = self.env[wiz_model].with_context(**ctx).create({})
+
+            # Intentar los métodos comunes del wizard
+            for method_name in ['process', 'action_close_mo', 'action_produce', 'action_confirm']:
+                if hasattr(wiz, method_name):
+                    getattr(wiz, method_name)()
+                    if self._mo_is_done(mo):
+                        return f'{prefix}+wizard.{method_name}'
+                    break
+        except Exception as wiz_err:
+            errors_log.append(f"{label}: {wiz_err}")
+        return False
+
+    @api.model
+    def _strategy_button_mark_done(self, mo, errors_log, attempted):
         # ═══════════════════════════════════════════════════════════
         # Estrategia 1: button_mark_done (primera llamada)
         #   En Odoo 19 esto típicamente lleva a 'to_close'
         # ═══════════════════════════════════════════════════════════
         try:
             result = mo.button_mark_done()
-            if _is_done():
-                return {
-                    'completed': True, 'state': 'done',
-                    'error_detail': '', 'strategy_used': 'button_mark_done',
-                }
-
-            # button_mark_done puede devolver un wizard action dict
-            if isinstance(result, dict) and result.get('res_model'):
-                try:
-                    wiz_model = result['res_model']
-                    wiz_id = result.get('res_id')
-                    ctx = result.get('context', {})
-                    if wiz_id:
-                        wiz = self.env[wiz_model].with_context(**ctx).browse(wiz_id)
-                    else:
-                        wiz = self.env[wiz_model].with_context(**ctx).create({})
-
-                    # Intentar los métodos comunes del wizard
-                    for method_name in ['process', 'action_close_mo', 'action_produce', 'action_confirm']:
-                        if hasattr(wiz, method_name):
-                            getattr(wiz, method_name)()
-                            if _is_done():
-                                return {
-                                    'completed': True, 'state': 'done',
-                                    'error_detail': '',
-                                    'strategy_used': f'button_mark_done+wizard.{method_name}',
-                                }
-                            break
-                except Exception as wiz_err:
-                    errors_log.append(f"wizard from button_mark_done: {wiz_err}")
-
+            if self._mo_is_done(mo):
+                return 'button_mark_done'
+            used = self._run_mark_done_wizard(
+                mo, result, 'button_mark_done', errors_log, 'wizard from button_mark_done',
+            )
+            if used:
+                return used
             errors_log.append(f"button_mark_done: estado={mo.state}")
         except Exception as e1:
             errors_log.append(f"button_mark_done: {e1}")
             _logger.warning("Estrategia 1 fallo: %s", e1)
+        return False
 
+    @api.model
+    def _strategy_double_button_mark_done(self, mo, errors_log, attempted):
         # ═══════════════════════════════════════════════════════════
         # Estrategia 2: Si está en 'to_close', llamar button_mark_done
         #   DE NUEVO — en Odoo 19 esto cierra la MO
         # ═══════════════════════════════════════════════════════════
         try:
             mo.invalidate_recordset()
-            if mo.state == 'to_close':
-                _logger.info("MO %s en to_close, llamando button_mark_done por segunda vez", mo.name)
-                result2 = mo.button_mark_done()
-                if _is_done():
-                    return {
-                        'completed': True, 'state': 'done',
-                        'error_detail': '',
-                        'strategy_used': 'double_button_mark_done',
-                    }
-                # Si devuelve wizard de nuevo
-                if isinstance(result2, dict) and result2.get('res_model'):
-                    try:
-                        wiz_model = result2['res_model']
-                        wiz_id = result2.get('res_id')
-                        ctx = result2.get('context', {})
-                        if wiz_id:
-                            wiz = self.env[wiz_model].with_context(**ctx).browse(wiz_id)
-                        else:
-                            wiz = self.env[wiz_model].with_context(**ctx).create({})
-                        for method_name in ['process', 'action_close_mo', 'action_produce', 'action_confirm']:
-                            if hasattr(wiz, method_name):
-                                getattr(wiz, method_name)()
-                                if _is_done():
-                                    return {
-                                        'completed': True, 'state': 'done',
-                                        'error_detail': '',
-                                        'strategy_used': f'double_mark_done+wizard.{method_name}',
-                                    }
-                                break
-                    except Exception as wiz2_err:
-                        errors_log.append(f"wizard from 2nd button_mark_done: {wiz2_err}")
-                errors_log.append(f"double_button_mark_done: estado={mo.state}")
+            if mo.state != 'to_close' and 'button_mark_done' not in attempted:
+                # Con orden adaptativo puede correr primero: hace la primera llamada
+                result = mo.button_mark_done()
+                if self._mo_is_done(mo):
+                    return 'button_mark_done'
+                used = self._run_mark_done_wizard(
+                    mo, result, 'button_mark_done', errors_log, 'wizard from button_mark_done',
+                )
+                if used:
+                    return used
+            if mo.state != 'to_close':
+                return None
+            _logger.info("MO %s en to_close, llamando button_mark_done por segunda vez", mo.name)
+            result2 = mo.button_mark_done()
+            if self._mo_is_done(mo):
+                return 'double_button_mark_done'
+            # Si devuelve wizard de nuevo
+            used = self._run_mark_done_wizard(
+                mo, result2, 'double_mark_done', errors_log, 'wizard from 2nd button_mark_done',
+            )
+            if used:
+                return used
+            errors_log.append(f"double_button_mark_done: estado={mo.state}")
         except Exception as e2:
             errors_log.append(f"double_button_mark_done: {e2}")
             _logger.warning("Estrategia 2 fallo: %s", e2)
+        return False
 
+    @api.model
+    def _strategy_backorder_wizard(self, mo, errors_log, attempted):
         # ═══════════════════════════════════════════════════════════
         # Estrategia 3: Backorder wizard con contexto explícito
         # ═══════════════════════════════════════════════════════════
+        backorder_model = 'mrp.production.backorder'
         try:
             mo.invalidate_recordset()
-            if mo.state in ('to_close', 'progress', 'confirmed'):
-                backorder_model = 'mrp.production.backorder'
-                if backorder_model in self.env:
-                    ctx = {
-                        'active_id': mo.id,
-                        'active_ids': [mo.id],
-                        'button_mark_done_production_ids': [mo.id],
-                    }
-                    wiz = self.env[backorder_model].with_context(**ctx).create({})
-                    # Probar todos los métodos posibles
-                    for method_name in ['action_close_mo', 'action_produce', 'process', 'action_confirm']:
-                        if hasattr(wiz, method_name):
-                            try:
-                                getattr(wiz, method_name)()
-                                if _is_done():
-                                    return {
-                                        'completed': True, 'state': 'done',
-                                        'error_detail': '',
-                                        'strategy_used': f'backorder_wizard.{method_name}',
-                                    }
-                            except Exception as m_err:
-                                errors_log.append(f"backorder.{method_name}: {m_err}")
-                    errors_log.append(f"backorder wizard: estado={mo.state}")
+            if mo.state not in ('to_close', 'progress', 'confirmed') or backorder_model not in self.env:
+                return None
+            ctx = {
+                'active_id': mo.id,
+                'active_ids': [mo.id],
+                'button_mark_done_production_ids': [mo.id],
+            }
+            wiz = self.env[backorder_model].with_context(**ctx).create({})
+            # Probar todos los métodos posibles
+            for method_name in ['action_close_mo', 'action_produce', 'process', 'action_confirm']:
+                if hasattr(wiz, method_name):
+                    try:
+                        getattr(wiz, method_name)()
+                        if self._mo_is_done(mo):
+                            return f'backorder_wizard.{method_name}'
+                    except Exception as m_err:
+                        errors_log.append(f"backorder.{method_name}: {m_err}")
+            errors_log.append(f"backorder wizard: estado={mo.state}")
         except Exception as e3:
             errors_log.append(f"backorder wizard: {e3}")
             _logger.warning("Estrategia 3 fallo: %s", e3)
+        return False
 
+    @api.model
+    def _strategy_immediate(self, mo, errors_log, attempted):
         # ═══════════════════════════════════════════════════════════
         # Estrategia 4: immediate.production wizard
         # ═══════════════════════════════════════════════════════════
+        immediate_model = 'mrp.immediate.production'
         try:
             mo.invalidate_recordset()
-            if mo.state != 'done':
-                immediate_model = 'mrp.immediate.production'
-                if immediate_model in self.env:
-                    wiz = self.env[immediate_model].with_context(
-                        active_id=mo.id, active_ids=[mo.id],
-                    ).create({})
-                    for method_name in ['process', 'action_confirm', 'generate_produce']:
-                        if hasattr(wiz, method_name):
-                            try:
-                                getattr(wiz, method_name)()
-                                if _is_done():
-                                    return {
-                                        'completed': True, 'state': 'done',
-                                        'error_detail': '',
-                                        'strategy_used': f'immediate.{method_name}',
-                                    }
-                            except Exception:
-                                pass
-                    errors_log.append(f"immediate wizard: estado={mo.state}")
+            if mo.state == 'done' or immediate_model not in self.env:
+                return None
+            wiz = self.env[immediate_model].with_context(
+                active_id=mo.id, active_ids=[mo.id],
+            ).create({})
+            for method_name in ['process', 'action_confirm', 'generate_produce']:
+                if hasattr(wiz, method_name):
+                    try:
+                        getattr(wiz, method_name)()
+                        if self._mo_is_done(mo):
+                            return f'immediate.{method_name}'
+                    except Exception:
+                        pass
+            errors_log.append(f"immediate wizard: estado={mo.state}")
         except Exception as e4:
             errors_log.append(f"immediate wizard: {e4}")
+        return False
 
+    @api.model
+    def _strategy_force_moves_done(self, mo, errors_log, attempted):
         # ═══════════════════════════════════════════════════════════
         # Estrategia 5: Forzar moves a done + action_done en la MO
         # ═══════════════════════════════════════════════════════════
         try:
             mo.invalidate_recordset()
-            if mo.state != 'done':
-                for move in mo.move_raw_ids:
-                    if move.state not in ('done', 'cancel'):
-                        move.quantity = move.product_uom_qty
-                        move._action_done()
-                for move in mo.move_finished_ids:
-                    if move.state not in ('done', 'cancel'):
-                        move.quantity = move.product_uom_qty
-                        move._action_done()
-
-                if _is_done():
-                    return {
-                        'completed': True, 'state': 'done',
-                        'error_detail': '',
-                        'strategy_used': 'force_moves_done',
-                    }
-
-                # Último intento: button_mark_done después de forzar moves
-                try:
-                    mo.button_mark_done()
-                    if _is_done():
-                        return {
-                            'completed': True, 'state': 'done',
-                            'error_detail': '',
-                            'strategy_used': 'force_moves+button_mark_done',
-                        }
-                except Exception:
-                    pass
+            if mo.state == 'done':
+                return None
+            for move in mo.move_raw_ids:
+                if move.state not in ('done', 'cancel'):
+                    move.quantity = move.product_uom_qty
+                    move._action_done()
+            for move in mo.move_finished_ids:
+                if move.state not in ('done', 'cancel'):
+                    move.quantity = move.product_uom_qty
+                    move._action_done()
+
+            if self._mo_is_done(mo):
+                return 'force_moves_done'
+
+            # Último intento: button_mark_done después de forzar moves
+            try:
+                mo.button_mark_done()
+                if self._mo_is_done(mo):
+                    return 'force_moves+button_mark_done'
+            except Exception:
+                pass
 
-                errors_log.append(f"force_moves_done: estado={mo.state}")
+            errors_log.append(f"force_moves_done: estado={mo.state}")
         except Exception as e5:
             errors_log.append(f"force_moves_done: {e5}")
             _logger.warning("Estrategia 5 fallo: %s", e5)
+        return False
 
+    @api.model
+    def _strategy_sql_force_done(self, mo, errors_log, attempted):
         # ═══════════════════════════════════════════════════════════
         # Estrategia 6 (último recurso): SQL directo para to_close→done
-        # Solo se usa cuando TODAS las demás fallaron y la MO está
-        # en to_close (todos los moves ya están done)
+        # Solo se usa cuando la MO está en to_close y todos los moves
+        # ya están done
         # ═══════════════════════════════════════════════════════════
         try:
             mo.invalidate_recordset()
-            if mo.state == 'to_close':
-                # Verificar que todos los moves estén done
-                all_raw_done = all(m.state in ('done', 'cancel') for m in mo.move_raw_ids)
-                all_fin_done = all(m.state in ('done', 'cancel') for m in mo.move_finished_ids)
-                if all_raw_done and all_fin_done:
-                    _logger.warning(
-                        "MO %s: forzando state=done via SQL (todos los moves estan done)",
-                        mo.name
-                    )
-                    self.env.cr.execute(
-                        "UPDATE mrp_production SET state = 'done', date_finished = NOW() "
-                        "WHERE id = %s AND state = 'to_close'",
-                        (mo.id,)
-                    )
-                    mo.invalidate_recordset()
-                    if mo.state == 'done':
-                        return {
-                            'completed': True, 'state': 'done',
-                            'error_detail': '',
-                            'strategy_used': 'sql_force_done',
-                        }
-                    errors_log.append("SQL update no cambio el estado")
-                else:
-                    errors_log.append(
-                        f"to_close pero moves no done: raw={all_raw_done} fin={all_fin_done}"
-                    )
+            if mo.state != 'to_close':
+                return None
+            # Verificar que todos los moves estén done
+            all_raw_done = all(m.state in ('done', 'cancel') for m in mo.move_raw_ids)
+            all_fin_done = all(m.state in ('done', 'cancel') for m in mo.move_finished_ids)
+            if not (all_raw_done and all_fin_done):
+                errors_log.append(
+                    f"to_close pero moves no done: raw={all_raw_done} fin={all_fin_done}"
+                )
+                return False
+            _logger.warning(
+                "MO %s: forzando state=done via SQL (todos los moves estan done)",
+                mo.name
+            )
+            self.env.cr.execute(
+                "UPDATE mrp_production SET state = 'done', date_finished = NOW() "
+                "WHERE id = %s AND state = 'to_close'",
+                (mo.id,)
+            )
+            if self._mo_is_done(mo):
+                return 'sql_force_done'
+            errors_log.append("SQL update no cambio el estado")
         except Exception as e6:
             errors_log.append(f"sql_force: {e6}")
             _logger.warning("Estrategia 6 (SQL) fallo: %s", e6)
-
-        # ─── Ninguna estrategia funcionó ───────────────────────────
-        mo.invalidate_recordset()
-        error_summary = " | ".join(errors_log[-5:])
-        _logger.error(
-            "MO %s (ID %s) no pudo completarse. Estado final: %s. Errores: %s",
-            mo.name, mo.id, mo.state, error_summary
-        )
-        return {
-            'completed': False,
-            'state': mo.state,
-            'error_detail': error_summary,
-            'strategy_used': 'none',
-        }
+        return False
 
     # ─── Forzar validación de MO existente (retry) ─────────────────────────
     @api.model
@@ -756,9 +1489,22 @@ class AqSimplifiedMrpApi(models.TransientModel):
         qty = mo.product_qty
         finished_lot = mo.lot_producing_id or None
 
-        result = self._complete_mo_robust(mo, product, qty, finished_lot)
+        with self._perf('force_validate_mo') as perf:
+            with perf.stage('completion'):
+                result = self._complete_mo_robust(mo, product, qty, finished_lot, perf=perf)
 
         if result['completed']:
+            # Cierra trabajos diferidos que sigan abiertos para esta MO
+            self.env['simplified.mrp.completion.job'].search([
+                ('production_id', '=', mo.id),
+                ('state', '!=', 'done'),
+            ]).write({
+                'state': 'done',
+                'strategy_used': result['strategy_used'],
+                'error_detail': '',
+                'date_done': fields.Datetime.now(),
+            })
+
             # Marcar sesion como confirmada
             try:
                 self.env['simplified.mrp.session'].mark_confirmed(mo.id)
@@ -782,248 +1528,577 @@ class AqSimplifiedMrpApi(models.TransientModel):
                 'error_detail': result['error_detail'],
             }
 
-    # ─── Crear MO ──────────────────────────────────────────────────────────
     @api.model
-    def create_mo(self, payload):
-        try:
-            warehouse_id = payload.get('warehouse_id')
-            product_id = payload.get('product_id')
-            product_qty = payload.get('product_qty', 1.0)
-            bom_id = payload.get('bom_id')
-            components_map = payload.get('components') or []
-            byproducts_map = payload.get('byproducts') or []
-            origin_ref = payload.get('origin') or 'Simplified UI'
-            custom_dest_loc = payload.get('location_dest_id')
-            manual_lot_name = payload.get('manual_lot_name') or None
-            auto_create_bom = payload.get('auto_create_bom', False)
-
-            comps_clean = []
-            for c in components_map:
-                if not c:
-                    continue
-                pid = int(c.get('product_id')) if c.get('product_id') else False
-                total_qty = float(c.get('qty', 0.0))
-                lots_data = c.get('selected_lots', [])
-                if pid and total_qty > 0:
-                    comps_clean.append({'product_id': pid, 'qty': total_qty, 'lots': lots_data})
-
-            if not warehouse_id or not product_id:
-                raise UserError(_('Faltan datos obligatorios'))
-            if not comps_clean:
-                raise UserError(_('Debes capturar al menos un ingrediente con cantidad mayor a cero.'))
-
-            wh = self.env['stock.warehouse'].browse(int(warehouse_id))
-            product = self.env['product.product'].browse(int(product_id))
-            qty = float(product_qty)
-            if not wh.exists():
-                raise UserError(_('Almacen invalido'))
-            if not product.exists():
-                raise UserError(_('Producto invalido'))
-
-            pt = self._find_picking_type(wh)
-            if not pt:
-                raise UserError(_('No hay tipo de operacion de fabricacion configurado'))
-
-            # BOM handling
-            bom_message = ''
-            if not bom_id:
-                bom = self._find_bom(product)
-                if bom:
-                    bom_id = bom.id
-                    bom_message = 'bom_existing'
-                elif auto_create_bom:
-                    bom_comps = [{'product_id': c['product_id'], 'qty': c['qty']} for c in comps_clean]
-                    bom_bps = []
-                    for bp in byproducts_map:
-                        bp_pid = int(bp.get('product_id', 0))
-                        bp_qty = float(bp.get('qty', 0))
-                        if bp_pid and bp_qty > 0:
-                            bom_bps.append({'product_id': bp_pid, 'qty': bp_qty})
-                    bom_result = self.create_or_update_bom(product_id, bom_comps, bom_bps, qty)
-                    bom_id = bom_result['bom_id']
-                    bom_message = 'bom_created' if bom_result['created'] else 'bom_existing'
-
-            mo_vals = {
+    def _resolve_mo_bom(self, product, qty, comps_clean, byproducts_map, auto_create_bom, boms):
+        """BOM para la MO: existente, o creada con los ingredientes capturados."""
+        if product.id not in boms:
+            boms[product.id] = self._find_bom(product)
+        bom = boms[product.id]
+        if bom:
+            return bom.id, 'bom_existing'
+        if not auto_create_bom:
+            return False, ''
+        bom_comps = [{'product_id': c['product_id'], 'qty': c['qty']} for c in comps_clean]
+        bom_bps = []
+        for bp in byproducts_map:
+            bp_pid = int(bp.get('product_id', 0))
+            bp_qty = float(bp.get('qty', 0))
+            if bp_pid and bp_qty > 0:
+                bom_bps.append({'product_id': bp_pid, 'qty': bp_qty})
+        bom_result = self.create_or_update_bom(product.id, bom_comps, bom_bps, qty)
+        boms[product.id] = self.env['mrp.bom'].browse(bom_result['bom_id'])
+        return bom_result['bom_id'], 'bom_created' if bom_result['created'] else 'bom_existing'
+
+    @api.model
+    def _check_tolerances(self, bom, qty, comps_clean, config, declared_ids=None):
+        """
+        Replica en servidor la regla roja del Poka-Yoke: si no se permite
+        confirmar con alertas criticas, rechaza componentes de la formula
+        capturados en cero o con desviacion mayor a la tolerancia naranja.
+        Igual que el cliente, un componente ausente del payload no se evalua:
+        su move de la BOM conserva la cantidad planeada (ver
+        _apply_component_moves). `declared_ids` son los productos enviados,
+        incluidos los de cantidad cero; por defecto los de comps_clean.
+        """
+        if config['allow_confirm_red'] or not bom:
+            return
+        if declared_ids is None:
+            declared_ids = {c['product_id'] for c in comps_clean}
+        base = bom.product_qty or 1.0
+        expected = {}
+        for line in bom.bom_line_ids:
+            pid = line.product_id.id
+            expected[pid] = expected.get(pid, 0.0) + (line.product_qty * qty) / base
+        real = {}
+        for c in comps_clean:
+            real[c['product_id']] = real.get(c['product_id'], 0.0) + c['qty']
+        critical = []
+        for pid, exp_qty in expected.items():
+            if exp_qty <= 0 or pid not in declared_ids:
+                continue
+            got = real.get(pid, 0.0)
+            pct = abs(got - exp_qty) / exp_qty * 100.0
+            if got <= 0 or pct > config['tolerance_orange']:
+                critical.append(self.env['product.product'].browse(pid).display_name)
+        if critical:
+            raise UserError(_(
+                'Desviacion critica respecto de la formula en: %s. '
+                'La configuracion no permite confirmar con alertas rojas.'
+            ) % ', '.join(critical))
+
+    @api.model
+    def _create_finished_lot(self, mo, product, manual_lot_name=None, shared=None):
+        """Crea el lote del producto terminado (manual validado o automatico)."""
+        Lot = self.env['stock.lot']
+        if manual_lot_name:
+            lot_name = manual_lot_name.strip().upper()
+            if not LOT_PATTERN.match(lot_name):
+                raise UserError(_(
+                    'El lote "%(n)s" no cumple el patron XX-##-##-##-##.', n=lot_name
+                ))
+            if Lot.search([
+                ('name', '=', lot_name),
+                ('product_id', '=', product.id),
+                ('company_id', '=', mo.company_id.id),
+            ], limit=1):
+                raise UserError(_('El lote "%s" ya existe para este producto.') % lot_name)
+            finished_lot = Lot.create({
+                'name': lot_name,
                 'product_id': product.id,
-                'product_qty': qty,
-                'product_uom_id': product.uom_id.id,
-                'bom_id': bom_id or False,
-                'picking_type_id': pt.id,
-                'origin': origin_ref,
-            }
-            if custom_dest_loc:
-                mo_vals['location_dest_id'] = int(custom_dest_loc)
+                'company_id': mo.company_id.id,
+            })
+        else:
+            today = datetime.now().date()
+            prefix = self._lot_prefix(product, today)
+            pool = (shared or {}).get('lot_numbers', {}).get((product.id, mo.company_id.id, today))
+            if pool:
+                consecutive = pool.pop(0)
+            else:
+                consecutive = self.env['simplified.mrp.lot.counter']._reserve(
+                    product, mo.company_id, today, prefix,
+                )
+            finished_lot = Lot.create({
+                'name': f"{prefix}{consecutive:03d}",
+                'product_id': product.id,
+                'company_id': mo.company_id.id,
+            })
+        return finished_lot
 
-            mo = self.env['mrp.production'].create(mo_vals)
+    @api.model
+    def _lot_prefix(self, product, day):
+        return f"{day.strftime('%Y%m%d')}-{product.default_code or 'PROD'}-"
 
-            # ─── Lote producto terminado ───────────────────────────────
-            finished_lot = None
-            if product.tracking in ['lot', 'serial']:
-                Lot = self.env['stock.lot']
-                if manual_lot_name:
-                    lot_name = manual_lot_name.strip().upper()
-                    if not LOT_PATTERN.match(lot_name):
-                        raise UserError(_(
-                            'El lote "%(n)s" no cumple el patron XX-##-##-##-##.', n=lot_name
-                        ))
-                    if Lot.search([
-                        ('name', '=', lot_name),
-                        ('product_id', '=', product.id),
-                        ('company_id', '=', mo.company_id.id),
-                    ], limit=1):
-                        raise UserError(_('El lote "%s" ya existe para este producto.') % lot_name)
-                    finished_lot = Lot.create({
-                        'name': lot_name,
-                        'product_id': product.id,
-                        'company_id': mo.company_id.id,
-                    })
-                else:
-                    date_str = datetime.now().strftime('%Y%m%d')
-                    ref = product.default_code or 'PROD'
-                    existing = Lot.search([
-                        ('product_id', '=', product.id),
-                        ('company_id', '=', mo.company_id.id),
-                        ('name', 'like', f"{date_str}-{ref}-%"),
-                    ], order='name desc', limit=1)
-                    consecutive = 1
-                    if existing:
-                        try:
-                            consecutive = int(existing[0].name.split('-')[-1]) + 1
-                        except Exception:
-                            pass
-                    finished_lot = Lot.create({
-                        'name': f"{date_str}-{ref}-{consecutive:03d}",
-                        'product_id': product.id,
-                        'company_id': mo.company_id.id,
-                    })
-                mo.lot_producing_id = finished_lot.id
+    @api.model
+    def _reserve_lot_numbers(self, payloads, shared):
+        """
+        Reserva de una vez un bloque de consecutivos por producto para los
+        items del lote que usan nombre automatico. Los numeros de items que
+        fallen quedan sin usar (huecos, como en ir.sequence).
+        """
+        auto_lot = self._get_mrp_config_cached()['auto_lot']
+        counts = {}
+        for payload in payloads:
+            if not payload or not payload.get('product_id') or not payload.get('warehouse_id'):
+                continue
+            if payload.get('manual_lot_name') and not auto_lot:
+                continue
+            # La MO se crea en la compania del almacen (ver _create_mo): el pool
+            # se indexa igual que lo consulta _create_finished_lot (mo.company_id)
+            key = (int(payload['product_id']), int(payload['warehouse_id']))
+            counts[key] = counts.get(key, 0) + 1
+        if not counts:
+            return
+        today = datetime.now().date()
+        Counter = self.env['simplified.mrp.lot.counter']
+        pool = shared.setdefault('lot_numbers', {})
+        products = self.env['product.product'].browse(list({pid for pid, _wid in counts})).exists()
+        warehouses = self.env['stock.warehouse'].browse(list({wid for _pid, wid in counts})).exists()
+        by_company = {}
+        for (pid, wid), count in counts.items():
+            product = products.browse(pid) & products
+            warehouse = warehouses.browse(wid) & warehouses
+            if not warehouse or product.tracking not in ('lot', 'serial'):
+                continue
+            key = (product, warehouse.company_id)
+            by_company[key] = by_company.get(key, 0) + count
+        for (product, company), count in by_company.items():
+            first = Counter._reserve(product, company, today, self._lot_prefix(product, today), count)
+            pool[(product.id, company.id, today)] = list(range(first, first + count))
 
-            mo.action_confirm()
-            mo.user_id = self.env.uid
+    @api.model
+    def _apply_component_moves(self, mo, comps_clean):
+        """
+        Ajusta moves de componentes y sus move lines por lote. Se recolectan
+        valores y se crea todo en bloque: un create de moves, un unlink de
+        lineas previas y un create de move lines.
+        """
+        Move = self.env['stock.move']
+        MoveLine = self.env['stock.move.line']
+        comps_by_pid = {item['product_id']: item for item in comps_clean}
+        products_by_id = {
+            p.id: p for p in self.env['product.product'].browse(list(comps_by_pid))
+        }
+        existing_by_pid = {m.product_id.id: m for m in mo.move_raw_ids}
+
+        new_move_vals = []
+        for pid, item in comps_by_pid.items():
+            move = existing_by_pid.get(pid)
+            if move:
+                # Ajustar la cantidad demandada
+                move.product_uom_qty = item['qty']
+            else:
+                # Componente no estaba en BOM, crear move
+                prod = products_by_id[pid]
+                new_move_vals.append({
+                    'name': prod.display_name,
+                    'product_id': pid,
+                    'product_uom_qty': item['qty'],
+                    'product_uom': prod.uom_id.id,
+                    'raw_material_production_id': mo.id,
+                    'company_id': mo.company_id.id,
+                    'location_id': mo.location_src_id.id,
+                    'location_dest_id': mo.location_dest_id.id,
+                })
+        if new_move_vals:
+            for move in Move.create(new_move_vals):
+                existing_by_pid[move.product_id.id] = move
+
+        comp_moves = Move.browse([existing_by_pid[pid].id for pid in comps_by_pid])
+
+        # Limpiar move lines existentes para recrearlas con lotes correctos
+        if comp_moves.move_line_ids:
+            comp_moves.move_line_ids.unlink()
+
+        # Crear move lines con lotes y cantidades
+        line_vals = []
+        for pid, item in comps_by_pid.items():
+            move = existing_by_pid[pid]
+            base_vals = {
+                'move_id': move.id,
+                'product_id': pid,
+                'product_uom_id': products_by_id[pid].uom_id.id,
+                'location_id': move.location_id.id,
+                'location_dest_id': move.location_dest_id.id,
+            }
+            if not item['lots']:
+                line_vals.append(dict(base_vals, quantity=item['qty']))
+                continue
+            for l_data in item['lots']:
+                l_id = l_data.get('lot_id')
+                l_qty = float(l_data.get('qty', 0.0))
+                if l_qty <= 0:
+                    continue
+                real_lot_id = l_id if (l_id and l_id != -1) else False
+                line_vals.append(dict(base_vals, lot_id=real_lot_id, quantity=l_qty))
+        if line_vals:
+            MoveLine.create(line_vals)
 
-            # ─── Componentes: ajustar cantidades y lotes ──────────────
-            existing_by_pid = {m.product_id.id: m for m in mo.move_raw_ids}
+        # ─── CLAVE: marcar TODOS los raw moves como picked ─────────
+        # En Odoo 18, si picked=False, button_mark_done no consume
+        if 'picked' in Move._fields:
+            mo.move_raw_ids.write({'picked': True})
 
-            for item in comps_clean:
-                pid = item['product_id']
-                req_qty_total = item['qty']
-                lots_distribution = item['lots']
-                prod = self.env['product.product'].browse(pid)
-                move = existing_by_pid.get(pid)
+    # ─── Crear MO ──────────────────────────────────────────────────────────
+    @api.model
+    def create_mo(self, payload):
+        try:
+            with self._perf('create_mo') as perf:
+                return self._create_mo(payload, perf=perf)
+        except Exception as e:
+            _logger.error("Error creating MO: %s", e, exc_info=True)
+            raise UserError(_('Error creando orden de produccion: %s') % e)
 
-                if move:
-                    # Ajustar la cantidad demandada
-                    move.product_uom_qty = req_qty_total
-                else:
-                    # Componente no estaba en BOM, crear move
-                    move = self.env['stock.move'].create({
-                        'name': prod.display_name,
-                        'product_id': pid,
-                        'product_uom_qty': req_qty_total,
-                        'product_uom': prod.uom_id.id,
-                        'raw_material_production_id': mo.id,
-                        'company_id': mo.company_id.id,
-                        'location_id': mo.location_src_id.id,
-                        'location_dest_id': mo.location_dest_id.id,
-                    })
-                    existing_by_pid[pid] = move
+    @api.model
+    def create_mo_batch(self, payloads):
+        """
+        Registra varias producciones en una sola llamada. Almacenes, tipos de
+        operacion, productos y BOM resueltos se comparten entre items; cada
+        MO corre en su propio savepoint, de modo que un error no revierte las
+        demas. Retorna un resultado por item en el mismo orden.
+        """
+        shared = {}
+        results = []
+        perf = self._perf('create_mo_batch')
+        with perf.stage('reserve_lot_numbers'):
+            self._reserve_lot_numbers(payloads or [], shared)
+        for index, payload in enumerate(payloads or []):
+            shared['created_boms'] = set()
+            try:
+                with self.env.cr.savepoint():
+                    res = self._create_mo(payload or {}, shared=shared, mark_session=False, perf=perf)
+                res.update({'index': index, 'success': True, 'errors': []})
+            except Exception as e:
+                _logger.warning("Error creating MO %s in batch: %s", index, e, exc_info=True)
+                # Una BOM creada en el savepoint revertido ya no existe. El mapa
+                # cacheado no la contiene: MrpBom.create ya limpio la cache
+                # y nada lo recalcula despues dentro del mismo item.
+                for created_pid in shared['created_boms']:
+                    shared['boms'].pop(created_pid, None)
+                res = {
+                    'index': index, 'success': False, 'mo_id': False,
+                    'state': False, 'completed': False, 'errors': [str(e)],
+                }
+            results.append(res)
+        perf.flush()
+        return results
+
+    @api.model
+    def _create_mo(self, payload, shared=None, mark_session=True, perf=None):
+        """
+        Crea, confirma y completa una MO a partir del payload del asistente.
+        `shared` es un dict opcional para reutilizar resoluciones entre
+        varias llamadas (ver create_mo_batch); `perf` mide cada etapa.
+        """
+        shared = shared if shared is not None else {}
+        perf = perf or PerfRecorder(self.env, 'create_mo', enabled=False)
+        warehouse_id = payload.get('warehouse_id')
+        product_id = payload.get('product_id')
+        product_qty = payload.get('product_qty', 1.0)
+        bom_id = payload.get('bom_id')
+        components_map = payload.get('components') or []
+        byproducts_map = payload.get('byproducts') or []
+        origin_ref = payload.get('origin') or 'Simplified UI'
+        custom_dest_loc = payload.get('location_dest_id')
+        # Politicas del servidor: no se confia en las banderas del cliente
+        config = self._get_mrp_config_cached()
+        manual_lot_name = None if config['auto_lot'] else (payload.get('manual_lot_name') or None)
+        auto_create_bom = config['auto_create_bom']
+
+        comps_clean = []
+        for c in components_map:
+            if not c:
+                continue
+            pid = int(c.get('product_id')) if c.get('product_id') else False
+            total_qty = float(c.get('qty', 0.0))
+            lots_data = c.get('selected_lots', [])
+            if pid and total_qty > 0:
+                comps_clean.append({'product_id': pid, 'qty': total_qty, 'lots': lots_data})
+
+        if not warehouse_id or not product_id:
+            raise UserError(_('Faltan datos obligatorios'))
+        if not comps_clean:
+            raise UserError(_('Debes capturar al menos un ingrediente con cantidad mayor a cero.'))
+
+        warehouses = shared.setdefault('warehouses', {})
+        products = shared.setdefault('products', {})
+        picking_types = shared.setdefault('picking_types', {})
+        boms = shared.setdefault('boms', {})
+
+        if int(warehouse_id) not in warehouses:
+            warehouses[int(warehouse_id)] = self.env['stock.warehouse'].browse(int(warehouse_id)).exists()
+        if int(product_id) not in products:
+            products[int(product_id)] = self.env['product.product'].browse(int(product_id)).exists()
+        wh = warehouses[int(warehouse_id)]
+        product = products[int(product_id)]
+        qty = float(product_qty)
+        if not wh:
+            raise UserError(_('Almacen invalido'))
+        if not product:
+            raise UserError(_('Producto invalido'))
+
+        if wh.id not in picking_types:
+            with perf.stage('picking_type'):
+                picking_types[wh.id] = self._find_picking_type(wh)
+        pt = picking_types[wh.id]
+        if not pt:
+            raise UserError(_('No hay tipo de operacion de fabricacion configurado'))
+
+        # BOM handling
+        bom_message = ''
+        if not bom_id:
+            with perf.stage('bom'):
+                bom_id, bom_message = self._resolve_mo_bom(
+                    product, qty, comps_clean, byproducts_map, auto_create_bom, boms,
+                )
+        if bom_message == 'bom_created':
+            shared.setdefault('created_boms', set()).add(product.id)
+        if bom_id and bom_message != 'bom_created':
+            declared_ids = {int(c['product_id']) for c in components_map if c and c.get('product_id')}
+            self._check_tolerances(
+                self.env['mrp.bom'].browse(int(bom_id)), qty, comps_clean, config, declared_ids,
+            )
 
-                # Limpiar move lines existentes para recrearlas con lotes correctos
-                if move.move_line_ids:
-                    move.move_line_ids.unlink()
+        mo_vals = {
+            'product_id': product.id,
+            'product_qty': qty,
+            'product_uom_id': product.uom_id.id,
+            'bom_id': bom_id or False,
+            'picking_type_id': pt.id,
+            'company_id': wh.company_id.id,
+            'origin': origin_ref,
+        }
+        if custom_dest_loc:
+            mo_vals['location_dest_id'] = int(custom_dest_loc)
 
-                # Crear move lines con lotes y cantidades
-                if not lots_distribution:
-                    self.env['stock.move.line'].create({
-                        'move_id': move.id,
-                        'product_id': pid,
-                        'product_uom_id': prod.uom_id.id,
-                        'location_id': move.location_id.id,
-                        'location_dest_id': move.location_dest_id.id,
-                        'quantity': req_qty_total,
-                    })
-                else:
-                    for l_data in lots_distribution:
-                        l_id = l_data.get('lot_id')
-                        l_qty = float(l_data.get('qty', 0.0))
-                        if l_qty <= 0:
-                            continue
-                        real_lot_id = l_id if (l_id and l_id != -1) else False
-                        self.env['stock.move.line'].create({
-                            'move_id': move.id,
-                            'product_id': pid,
-                            'product_uom_id': prod.uom_id.id,
-                            'location_id': move.location_id.id,
-                            'location_dest_id': move.location_dest_id.id,
-                            'lot_id': real_lot_id,
-                            'quantity': l_qty,
-                        })
+        with perf.stage('mo_create'):
+            mo = self.env['mrp.production'].create(mo_vals)
 
-                # ─── CLAVE: marcar el move como picked ─────────────────
-                # En Odoo 18, si picked=False, button_mark_done no consume
-                if hasattr(move, 'picked'):
-                    move.picked = True
+        # ─── Lote producto terminado ───────────────────────────────
+        finished_lot = None
+        if product.tracking in ['lot', 'serial']:
+            with perf.stage('finished_lot'):
+                finished_lot = self._create_finished_lot(mo, product, manual_lot_name, shared=shared)
+                mo.lot_producing_id = finished_lot.id
 
-            # Marcar TODOS los raw moves como picked
-            for move in mo.move_raw_ids:
-                if hasattr(move, 'picked'):
-                    move.picked = True
+        with perf.stage('confirm'):
+            mo.action_confirm()
+            mo.user_id = self.env.uid
 
+        # ─── Componentes: ajustar cantidades y lotes ──────────────
+        with perf.stage('component_moves'):
+            self._apply_component_moves(mo, comps_clean)
+
+        with perf.stage('action_assign'):
             try:
                 mo.action_assign()
             except Exception as e:
                 _logger.warning("Auto assign warning: %s", e)
 
-            # ─── Setear qty_producing ANTES de button_mark_done ────────
-            # Esto es FUNDAMENTAL: le dice a Odoo cuánto se produjo
-            mo.qty_producing = qty
-
-            # ─── Completar MO (robusto) ───────────────────────────────
-            completion = self._complete_mo_robust(mo, product, qty, finished_lot)
+        # ─── Setear qty_producing ANTES de button_mark_done ────────
+        # Esto es FUNDAMENTAL: le dice a Odoo cuánto se produjo
+        mo.qty_producing = qty
+
+        # ─── Completar MO (robusto o diferido) ────────────────────
+        deferred = payload.get('deferred_completion')
+        if deferred is None:
+            deferred = config['deferred_completion']
+        with perf.stage('completion'):
+            if deferred:
+                job = self.env['simplified.mrp.completion.job']._enqueue(mo, finished_lot)
+                completion = {
+                    'completed': False, 'state': mo.state,
+                    'error_detail': '', 'strategy_used': 'deferred',
+                }
+            else:
+                completion = self._complete_mo_robust(mo, product, qty, finished_lot, perf=perf)
 
-            # Marcar sesion como confirmada
+        # Marcar sesion como confirmada
+        if mark_session:
             try:
                 self.env['simplified.mrp.session'].mark_confirmed(mo.id)
             except Exception:
                 pass
 
-            result = {
-                'mo_id': mo.id,
-                'name': mo.name,
-                'state': completion['state'],
-                'bom_message': bom_message,
-                'completed': completion['completed'],
-                'completion_strategy': completion['strategy_used'],
-            }
+        result = {
+            'mo_id': mo.id,
+            'name': mo.name,
+            'state': completion['state'],
+            'bom_message': bom_message,
+            'completed': completion['completed'],
+            'completion_strategy': completion['strategy_used'],
+        }
 
-            if not completion['completed']:
-                result['completion_error'] = completion['error_detail']
-                result['needs_force_validate'] = True
+        if deferred:
+            result['completion_pending'] = True
+            result['job_id'] = job.id
+        elif not completion['completed']:
+            result['completion_error'] = completion['error_detail']
+            result['needs_force_validate'] = True
 
-            return result
+        return result
 
-        except Exception as e:
-            _logger.error("Error creating MO: %s", e, exc_info=True)
-            raise UserError(_('Error creando orden de produccion: %s') % e)
+    @api.model
+    def get_completion_status(self, mo_ids):
+        """Estado de cierre de MOs (incluye el ultimo trabajo diferido de cada una)."""
+        mos = self.env['mrp.production'].browse([int(i) for i in (mo_ids or [])]).exists()
+        jobs = self.env['simplified.mrp.completion.job'].search([('production_id', 'in', mos.ids)])
+        last_job = {}
+        for job in jobs:
+            # _order = 'id desc': el primero por MO es el mas reciente
+            last_job.setdefault(job.production_id.id, job)
+        result = []
+        for mo in mos:
+            job = last_job.get(mo.id)
+            job_state = job.state if job else False
+            result.append({
+                'mo_id': mo.id,
+                'name': mo.name,
+                'state': mo.state,
+                'completed': mo.state == 'done',
+                'pending': job_state == 'pending',
+                'job_state': job_state,
+                'strategy_used': (job.strategy_used or '') if job else '',
+                'error_detail': (job.error_detail or '') if job else '',
+                'needs_force_validate': job_state == 'failed' and mo.state != 'done',
+            })
+        return result
 
     # ─── List & Detail ─────────────────────────────────────────────────────
     @api.model
     def get_my_productions(self, limit=50):
-        mos = self.env['mrp.production'].search(
-            [('user_id', '=', self.env.uid)],
-            limit=int(limit), order='date_start desc, id desc',
+        return self.get_my_productions_page(limit=limit)['productions']
+
+    @api.model
+    def get_my_productions_page(self, limit=50, cursor=None, since_write_date=None, states=None):
+        """
+        Producciones del usuario paginadas por cursor sobre (date_start, id),
+        descendente. `since_write_date` limita a las modificadas desde esa
+        fecha (sondeo incremental) y `states` filtra por estado. Retorna
+        {'productions', 'next_cursor', 'synced_at'}; `synced_at` es el valor a
+        enviar como `since_write_date` en el siguiente sondeo.
+        """
+        # write_date es la hora de inicio de cada transaccion: se deja un
+        # margen para no perder escrituras en curso (los repetidos se fusionan
+        # por id en el cliente)
+        synced_at = fields.Datetime.to_string(fields.Datetime.subtract(fields.Datetime.now(), seconds=60))
+        domain = [('user_id', '=', self.env.uid)]
+        if states:
+            domain.append(('state', 'in', list(states)))
+        if since_write_date:
+            domain.append(('write_date', '>=', fields.Datetime.to_datetime(since_write_date)))
+        if cursor:
+            date_start = fields.Datetime.to_datetime(cursor['date_start'])
+            domain += [
+                '|', ('date_start', '<', date_start),
+                '&', ('date_start', '=', date_start), ('id', '<', int(cursor['id'])),
+            ]
+        limit = int(limit)
+        # Una lectura por modelo: columnas de la MO y nombres de producto/UdM
+        rows = self.env['mrp.production'].search_read(
+            domain,
+            ['name', 'state', 'product_id', 'product_qty', 'product_uom_id', 'date_start', 'date_finished'],
+            limit=limit + 1, order='date_start desc, id desc',
         )
-        return [{
-            'id': mo.id,
-            'name': mo.name,
-            'state': mo.state,
-            'product_id': mo.product_id.id,
-            'product_name': mo.product_id.display_name,
-            'product_qty': mo.product_qty,
-            'uom_name': mo.product_uom_id.name,
-            'date_start': mo.date_start.isoformat() if mo.date_start else False,
-            'date_finished': mo.date_finished.isoformat() if mo.date_finished else False,
-        } for mo in mos]
+        next_cursor = False
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = {
+                'date_start': fields.Datetime.to_string(rows[-1]['date_start']),
+                'id': rows[-1]['id'],
+            }
+        return {
+            'productions': [{
+                'id': row['id'],
+                'name': row['name'],
+                'state': row['state'],
+                'product_id': row['product_id'] and row['product_id'][0],
+                'product_name': row['product_id'] and row['product_id'][1],
+                'product_qty': row['product_qty'],
+                'uom_name': row['product_uom_id'] and row['product_uom_id'][1],
+                'date_start': row['date_start'].isoformat() if row['date_start'] else False,
+                'date_finished': row['date_finished'].isoformat() if row['date_finished'] else False,
+            } for row in rows],
+            'next_cursor': next_cursor,
+            'synced_at': synced_at,
+        }
+
+    @api.model
+    def trace_lot_backward(self, lot_id, max_depth=50):
+        """Todos los lotes consumidos, a cualquier nivel, para producir `lot_id`."""
+        return self._trace_lot(lot_id, 'backward', max_depth)
+
+    @api.model
+    def trace_lot_forward(self, lot_id, max_depth=50):
+        """Todos los lotes producidos, a cualquier nivel, que contienen `lot_id`."""
+        return self._trace_lot(lot_id, 'forward', max_depth)
+
+    @api.model
+    def _trace_lot(self, lot_id, direction, max_depth):
+        if not self.env.user.has_group('aq_simplified_mrp.group_simplified_mrp_supervisor'):
+            raise UserError(_('No tienes permiso para consultar la trazabilidad de lotes'))
+        return self.env['simplified.mrp.lot.genealogy']._trace(lot_id, direction, max_depth)
+
+    @api.model
+    def _iter_traceability_chunks(self, date_from=None, date_to=None, state=None, warehouse_id=None,
+                                  chunk_size=5000):
+        """
+        Generador de filas de trazabilidad (MO, lote terminado, componente,
+        lote consumido, cantidad) por bloques de `chunk_size` move lines,
+        paginando por id: nunca mantiene el resultado completo en memoria.
+        """
+        lang = self.env.lang or 'en_US'
+        joins = ''
+        where = ['mp.company_id = ANY(%(companies)s)', 'sml.id > %(last_id)s']
+        params = {
+            'companies': self.env.companies.ids,
+            'last_id': 0,
+            'lang': lang,
+            'limit': int(chunk_size),
+        }
+        if date_from:
+            where.append('mp.date_start >= %(date_from)s')
+            params['date_from'] = date_from
+        if date_to:
+            where.append('mp.date_start < %(date_to)s')
+            params['date_to'] = date_to
+        if state:
+            where.append('mp.state = %(state)s')
+            params['state'] = state
+        if warehouse_id:
+            joins = 'JOIN stock_picking_type spt ON spt.id = mp.picking_type_id'
+            where.append('spt.warehouse_id = %(warehouse_id)s')
+            params['warehouse_id'] = int(warehouse_id)
+        query = """
+            SELECT sml.id, mp.name, mp.state, mp.date_start, mp.date_finished,
+                   COALESCE(fpt.name->>%(lang)s, fpt.name->>'en_US'), flot.name,
+                   cp.default_code, COALESCE(cpt.name->>%(lang)s, cpt.name->>'en_US'),
+                   clot.name, sml.quantity,
+                   COALESCE(u.name->>%(lang)s, u.name->>'en_US')
+              FROM stock_move_line sml
+              JOIN stock_move sm ON sm.id = sml.move_id
+              JOIN mrp_production mp ON mp.id = sm.raw_material_production_id
+              {joins}
+              JOIN product_product fp ON fp.id = mp.product_id
+              JOIN product_template fpt ON fpt.id = fp.product_tmpl_id
+         LEFT JOIN stock_lot flot ON flot.id = mp.lot_producing_id
+              JOIN product_product cp ON cp.id = sml.product_id
+              JOIN product_template cpt ON cpt.id = cp.product_tmpl_id
+         LEFT JOIN stock_lot clot ON clot.id = sml.lot_id
+         LEFT JOIN uom_uom u ON u.id = sml.product_uom_id
+             WHERE {where}
+          ORDER BY sml.id
+             LIMIT %(limit)s
+        """.format(joins=joins, where=' AND '.join(where))
+        self.env.flush_all()
+        while True:
+            self.env.cr.execute(query, params)
+            rows = self.env.cr.fetchall()
+            if not rows:
+                return
+            params['last_id'] = rows[-1][0]
+            yield [row[1:] for row in rows]
+            if len(rows) < params['limit']:
+                return
 
     @api.model
     def get_production_detail(self, mo_id):
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+ATTEMPT_RETENTION_DAYS = 90
+
+
+class SimplifiedMrpCompletionAttempt(models.Model):
+    _name = 'simplified.mrp.completion.attempt'
+    _description = 'Historial de estrategias de cierre de MO (MRP simplificado)'
+    _order = 'id desc'
+
+    strategy = fields.Char(required=True, index=True)
+    strategy_detail = fields.Char()
+    success = fields.Boolean()
+    duration_ms = fields.Float()
+    tracking = fields.Char(index=True)
+    company_id = fields.Many2one('res.company', required=True, index=True)
+    production_id = fields.Many2one('mrp.production', ondelete='set null')
+    # Intento hecho con el orden por defecto (re-aprendizaje)
+    relearn = fields.Boolean()
+
+    @api.autovacuum
+    def _gc_old_attempts(self):
+        """Conserva solo la historia reciente usada para ordenar estrategias."""
+        limit_date = fields.Datetime.subtract(fields.Datetime.now(), days=ATTEMPT_RETENTION_DAYS)
+        self.search([('create_date', '<', limit_date)]).unlink()
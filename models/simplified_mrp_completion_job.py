@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+import logging
+
+_logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+class SimplifiedMrpCompletionJob(models.Model):
+    _name = 'simplified.mrp.completion.job'
+    _description = 'Cierre diferido de orden de produccion (MRP simplificado)'
+    _order = 'id desc'
+
+    production_id = fields.Many2one('mrp.production', required=True, index=True, ondelete='cascade')
+    finished_lot_id = fields.Many2one('stock.lot')
+    user_id = fields.Many2one('res.users', default=lambda self: self.env.uid, required=True)
+    company_id = fields.Many2one('res.company', default=lambda self: self.env.company, required=True)
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('done', 'Completado'),
+        ('failed', 'Fallido'),
+    ], default='pending', required=True, index=True)
+    attempts = fields.Integer(default=0)
+    strategy_used = fields.Char()
+    error_detail = fields.Text()
+    date_done = fields.Datetime()
+
+    @api.model
+    def _enqueue(self, mo, finished_lot=None):
+        """Encola el cierre de la MO y despierta al cron sin esperar su intervalo."""
+        job = self.create({
+            'production_id': mo.id,
+            'finished_lot_id': finished_lot.id if finished_lot else False,
+            'company_id': mo.company_id.id,
+        })
+        cron = self.env.ref('aq_simplified_mrp.ir_cron_smrp_completion_jobs', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+        return job
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=20):
+        """Procesa un lote de trabajos pendientes; se re-agenda si quedan mas."""
+        self.flush_model(['state'])
+        self.env.cr.execute("""
+            SELECT id FROM simplified_mrp_completion_job
+             WHERE state = 'pending'
+          ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (batch_size,))
+        jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+        for job in jobs:
+            job._process()
+        remaining = self.search_count([('state', '=', 'pending')])
+        self.env['ir.cron']._notify_progress(done=len(jobs), remaining=remaining)
+
+    def _process(self):
+        self.ensure_one()
+        mo = self.production_id
+        if mo.state in ('done', 'cancel'):
+            self.write({
+                'state': 'done' if mo.state == 'done' else 'failed',
+                'error_detail': '' if mo.state == 'done' else _('La orden fue cancelada.'),
+                'date_done': fields.Datetime.now(),
+            })
+            return
+
+        api_model = self.env['aq.simplified.mrp.api'].with_user(self.user_id).with_company(self.company_id)
+        mo = mo.with_user(self.user_id).with_company(self.company_id)
+        try:
+            with self.env.cr.savepoint():
+                result = api_model._complete_mo_robust(
+                    mo, mo.product_id, mo.product_qty, self.finished_lot_id or None,
+                )
+        except Exception as e:
+            _logger.warning("Completion job %s (MO %s) failed: %s", self.id, mo.name, e, exc_info=True)
+            result = {'completed': False, 'state': mo.state, 'error_detail': str(e), 'strategy_used': 'none'}
+
+        attempts = self.attempts + 1
+        if result['completed']:
+            state = 'done'
+        else:
+            state = 'failed' if attempts >= MAX_ATTEMPTS else 'pending'
+        self.write({
+            'state': state,
+            'attempts': attempts,
+            'strategy_used': result['strategy_used'],
+            'error_detail': result['error_detail'],
+            'date_done': fields.Datetime.now() if state != 'pending' else False,
+        })
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+
+class SimplifiedMrpLotCounter(models.Model):
+    _name = 'simplified.mrp.lot.counter'
+    _description = 'Consecutivo diario de lotes terminados (MRP simplificado)'
+    _log_access = False
+
+    product_id = fields.Many2one('product.product', required=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', required=True, ondelete='cascade')
+    day = fields.Date(required=True)
+    last_value = fields.Integer(default=0)
+
+    _sql_constraints = [
+        ('product_company_day_uniq', 'UNIQUE(product_id, company_id, day)',
+         'Ya existe un consecutivo para este producto, compania y dia.'),
+    ]
+
+    @api.model
+    def _reserve(self, product, company, day, prefix, count=1):
+        """
+        Reserva `count` consecutivos para (producto, compania, dia) y retorna
+        el primero. El incremento es una sola sentencia atomica en un cursor
+        propio que confirma de inmediato: el bloqueo de fila dura lo que la
+        sentencia y no toda la creacion de la MO, y los numeros de una
+        transaccion revertida quedan como huecos (igual que ir.sequence). La
+        primera reserva del dia se siembra con el mayor sufijo existente para
+        `prefix`, por compatibilidad con lotes creados antes del contador.
+        """
+        count = max(int(count), 1)
+        with self.env.registry.cursor() as cr:
+            value = self._increment(cr, product, company, day, count)
+        if value is None:
+            # La siembra lee stock_lot desde la transaccion actual
+            seed = self._seed_value(product, company, prefix)
+            with self.env.registry.cursor() as cr:
+                value = self._insert(cr, product, company, day, seed, count)
+            if value is None:
+                # Producto o compania aun sin confirmar: solo esta transaccion
+                # los ve, asi que la reserva se hace en ella
+                value = self._increment(self.env.cr, product, company, day, count)
+                if value is None:
+                    value = self._insert(self.env.cr, product, company, day, seed, count)
+        return value - count + 1
+
+    @api.model
+    def _increment(self, cr, product, company, day, count):
+        cr.execute("""
+            UPDATE simplified_mrp_lot_counter
+               SET last_value = last_value + %s
+             WHERE product_id = %s AND company_id = %s AND day = %s
+         RETURNING last_value
+        """, (count, product.id, company.id, day))
+        row = cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def _insert(self, cr, product, company, day, seed, count):
+        """Crea el contador del dia; None si el cursor no ve el producto o la compania."""
+        cr.execute("""
+            INSERT INTO simplified_mrp_lot_counter (product_id, company_id, day, last_value)
+                 SELECT %(product)s, %(company)s, %(day)s, %(value)s
+                  WHERE EXISTS (SELECT 1 FROM product_product WHERE id = %(product)s)
+                    AND EXISTS (SELECT 1 FROM res_company WHERE id = %(company)s)
+            ON CONFLICT (product_id, company_id, day)
+              DO UPDATE SET last_value = simplified_mrp_lot_counter.last_value + %(count)s
+              RETURNING last_value
+        """, {
+            'product': product.id, 'company': company.id, 'day': day,
+            'value': seed + count, 'count': count,
+        })
+        row = cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def _seed_value(self, product, company, prefix):
+        """Mayor consecutivo ya usado con `prefix` (solo en la primera reserva del dia)."""
+        self.env['stock.lot'].flush_model(['name', 'product_id', 'company_id'])
+        self.env.cr.execute("""
+            SELECT MAX(substring(name FROM '(\\d+)$')::int)
+              FROM stock_lot
+             WHERE product_id = %s AND company_id = %s
+               AND name LIKE %s
+               AND name ~ '\\d+$'
+        """, (product.id, company.id, prefix.replace('%', '\\%').replace('_', '\\_') + '%'))
+        return self.env.cr.fetchone()[0] or 0
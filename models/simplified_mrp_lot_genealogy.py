@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+MAX_TRACE_DEPTH = 50
+
+
+class SimplifiedMrpLotGenealogy(models.Model):
+    _name = 'simplified.mrp.lot.genealogy'
+    _description = 'Genealogia de lotes: lote terminado <- lotes consumidos (MRP simplificado)'
+    _log_access = False
+
+    production_id = fields.Many2one('mrp.production', required=True, index=True, ondelete='cascade')
+    finished_lot_id = fields.Many2one('stock.lot', required=True, index=True, ondelete='cascade')
+    finished_product_id = fields.Many2one('product.product', required=True)
+    component_lot_id = fields.Many2one('stock.lot', required=True, index=True, ondelete='cascade')
+    component_product_id = fields.Many2one('product.product', required=True)
+    qty = fields.Float()
+    company_id = fields.Many2one('res.company', required=True)
+
+    _sql_constraints = [
+        ('production_component_lot_uniq', 'UNIQUE(production_id, finished_lot_id, component_lot_id)',
+         'La relacion entre lotes ya esta registrada para esta orden.'),
+    ]
+
+    @api.model
+    def _record_productions(self, production_ids):
+        """
+        Inserta en bloque los vinculos lote terminado -> lotes consumidos de
+        las MOs terminadas dadas, agregando las move lines por lote. Es
+        idempotente: volver a registrar una MO solo actualiza cantidades.
+        """
+        if not production_ids:
+            return
+        self.env['stock.move.line'].flush_model(['move_id', 'lot_id', 'quantity', 'product_id'])
+        self.env['stock.move'].flush_model(['raw_material_production_id', 'state'])
+        self.env['mrp.production'].flush_model(['lot_producing_id', 'product_id', 'state', 'company_id'])
+        self.env.cr.execute("""
+            INSERT INTO simplified_mrp_lot_genealogy
+                   (production_id, finished_lot_id, finished_product_id,
+                    component_lot_id, component_product_id, qty, company_id)
+            SELECT mp.id, mp.lot_producing_id, mp.product_id,
+                   sml.lot_id, sml.product_id, SUM(sml.quantity), mp.company_id
+              FROM mrp_production mp
+              JOIN stock_move sm ON sm.raw_material_production_id = mp.id AND sm.state = 'done'
+              JOIN stock_move_line sml ON sml.move_id = sm.id
+             WHERE mp.id = ANY(%s)
+               AND mp.state = 'done'
+               AND mp.lot_producing_id IS NOT NULL
+               AND sml.lot_id IS NOT NULL
+          GROUP BY mp.id, mp.lot_producing_id, mp.product_id, sml.lot_id, sml.product_id, mp.company_id
+            ON CONFLICT (production_id, finished_lot_id, component_lot_id)
+              DO UPDATE SET qty = EXCLUDED.qty
+        """, (list(production_ids),))
+
+    @api.model
+    def _cron_backfill(self, batch_size=500):
+        """
+        Registra la genealogia pendiente de MOs terminadas, por lotes. Una MO
+        se reprocesa mientras alguna de sus move lines con lote no tenga su
+        vinculo, asi que tambien completa MOs registradas a medias.
+        """
+        self.flush_model(['production_id', 'finished_lot_id', 'component_lot_id'])
+        self.env['stock.move.line'].flush_model(['move_id', 'lot_id'])
+        self.env['stock.move'].flush_model(['raw_material_production_id', 'state'])
+        self.env['mrp.production'].flush_model(['lot_producing_id', 'state'])
+        self.env.cr.execute("""
+            SELECT mp.id
+              FROM mrp_production mp
+             WHERE mp.state = 'done'
+               AND mp.lot_producing_id IS NOT NULL
+               AND EXISTS (
+                   SELECT 1
+                     FROM stock_move sm
+                     JOIN stock_move_line sml ON sml.move_id = sm.id
+                    WHERE sm.raw_material_production_id = mp.id
+                      AND sm.state = 'done'
+                      AND sml.lot_id IS NOT NULL
+                      AND NOT EXISTS (
+                          SELECT 1
+                            FROM simplified_mrp_lot_genealogy g
+                           WHERE g.production_id = mp.id
+                             AND g.finished_lot_id = mp.lot_producing_id
+                             AND g.component_lot_id = sml.lot_id
+                      )
+               )
+          ORDER BY mp.id
+             LIMIT %s
+        """, (batch_size,))
+        production_ids = [row[0] for row in self.env.cr.fetchall()]
+        self._record_productions(production_ids)
+        # Si el lote salio lleno puede quedar historia pendiente
+        remaining = 1 if len(production_ids) == batch_size else 0
+        self.env['ir.cron']._notify_progress(done=len(production_ids), remaining=remaining)
+
+    @api.model
+    def _trace(self, lot_id, direction='backward', max_depth=MAX_TRACE_DEPTH):
+        """
+        Recorre la genealogia con un CTE recursivo sobre los indices de lote.
+        backward: de un lote terminado a todos los lotes que lo componen;
+        forward: de un lote de componente a todos los lotes que lo contienen.
+        Retorna un vinculo por fila con su nivel (1 = directo).
+        """
+        if direction == 'forward':
+            start, follow = 'component_lot_id', 'finished_lot_id'
+        else:
+            start, follow = 'finished_lot_id', 'component_lot_id'
+        max_depth = max(1, min(int(max_depth or MAX_TRACE_DEPTH), MAX_TRACE_DEPTH))
+        self.flush_model()
+        self.env.cr.execute("""
+            WITH RECURSIVE trace AS (
+                SELECT g.id, g.{follow} AS next_lot, 1 AS depth, ARRAY[g.{start}, g.{follow}] AS path
+                  FROM simplified_mrp_lot_genealogy g
+                 WHERE g.{start} = %(lot)s AND g.company_id = ANY(%(companies)s)
+                UNION ALL
+                SELECT g.id, g.{follow}, t.depth + 1, t.path || g.{follow}
+                  FROM trace t
+                  JOIN simplified_mrp_lot_genealogy g ON g.{start} = t.next_lot
+                 WHERE t.depth < %(max_depth)s
+                   AND g.company_id = ANY(%(companies)s)
+                   AND NOT g.{follow} = ANY(t.path)
+            )
+            SELECT id, MIN(depth) FROM trace GROUP BY id ORDER BY MIN(depth), id
+        """.format(start=start, follow=follow), {
+            'lot': int(lot_id),
+            'companies': self.env.companies.ids,
+            'max_depth': max_depth,
+        })
+        depth_by_id = dict(self.env.cr.fetchall())
+        links = self.browse(list(depth_by_id))
+        return [{
+            'depth': depth_by_id[link.id],
+            'production_id': link.production_id.id,
+            'production_name': link.production_id.name,
+            'finished_lot_id': link.finished_lot_id.id,
+            'finished_lot_name': link.finished_lot_id.name,
+            'finished_product_name': link.finished_product_id.display_name,
+            'component_lot_id': link.component_lot_id.id,
+            'component_lot_name': link.component_lot_id.name,
+            'component_product_name': link.component_product_id.display_name,
+            'qty': link.qty,
+        } for link in links]
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from odoo import api, fields, models
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+SAMPLE_RETENTION_DAYS = 30
+
+
+class PerfRecorder:
+    """
+    Mide tiempo de pared y numero de consultas SQL por etapa de un endpoint.
+    Las muestras se acumulan en memoria y se guardan con un solo create al
+    terminar el endpoint; deshabilitado no hace nada.
+    """
+
+    def __init__(self, env, endpoint, enabled=True):
+        self.env = env
+        self.endpoint = endpoint
+        self.enabled = enabled
+        self.samples = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append({
+                'endpoint': self.endpoint,
+                'stage': name,
+                'duration_ms': (time.perf_counter() - started) * 1000.0,
+                'query_count': cr.sql_log_count - queries,
+            })
+
+    def __enter__(self):
+        self._total = self.stage('total')
+        self._total.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._total.__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def flush(self):
+        if not self.samples:
+            return
+        samples, self.samples = self.samples, []
+        try:
+            with self.env.cr.savepoint():
+                self.env['simplified.mrp.perf.sample'].sudo().create(samples)
+        except Exception as e:
+            _logger.warning("No se pudieron guardar las muestras de rendimiento: %s", e)
+
+
+class SimplifiedMrpPerfSample(models.Model):
+    _name = 'simplified.mrp.perf.sample'
+    _description = 'Muestra de rendimiento por etapa (MRP simplificado)'
+    _order = 'id desc'
+    _log_access = False
+
+    endpoint = fields.Char(required=True, index=True)
+    stage = fields.Char(required=True)
+    duration_ms = fields.Float()
+    query_count = fields.Integer()
+    create_date = fields.Datetime(default=fields.Datetime.now, index=True, readonly=True)
+
+    @api.model
+    def _get_stats(self, endpoint=None, days=7):
+        """Agregados moviles (p50/p95/max) por endpoint y etapa en la ventana dada."""
+        self.flush_model()
+        since = fields.Datetime.subtract(fields.Datetime.now(), days=int(days or 7))
+        where = 'create_date >= %s'
+        params = [since]
+        if endpoint:
+            where += ' AND endpoint = %s'
+            params.append(endpoint)
+        self.env.cr.execute("""
+            SELECT endpoint, stage, COUNT(*),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms),
+                   MAX(duration_ms),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY query_count),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY query_count),
+                   MAX(query_count)
+              FROM simplified_mrp_perf_sample
+             WHERE {where}
+          GROUP BY endpoint, stage
+          ORDER BY endpoint, stage
+        """.format(where=where), params)
+        return [{
+            'endpoint': row[0],
+            'stage': row[1],
+            'count': row[2],
+            'p50_ms': round(row[3] or 0.0, 2),
+            'p95_ms': round(row[4] or 0.0, 2),
+            'max_ms': round(row[5] or 0.0, 2),
+            'p50_queries': row[6] or 0,
+            'p95_queries': row[7] or 0,
+            'max_queries': row[8] or 0,
+        } for row in self.env.cr.fetchall()]
+
+    @api.autovacuum
+    def _gc_old_samples(self):
+        limit_date = fields.Datetime.subtract(fields.Datetime.now(), days=SAMPLE_RETENTION_DAYS)
+        self.search([('create_date', '<', limit_date)]).unlink()
@@ -1,10 +1,35 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models, _
-import json
+from itertools import zip_longest
+from odoo import api, fields, models, _, Command
+from odoo.exceptions import UserError
+from odoo.tools.sql import create_index
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Clave del payload del cliente -> campo escalar de la sesion
+SESSION_SCALAR_KEYS = {
+    'warehouse_id': 'warehouse_id',
+    'product_id': 'product_id',
+    'product_qty': 'product_qty',
+    'bom_id': 'bom_id',
+    'origin': 'origin',
+    'location_dest_id': 'location_dest_id',
+    'current_step': 'current_step',
+    'lot_seg1': 'lot_seg1',
+    'lot_seg2': 'lot_seg2',
+    'lot_seg3': 'lot_seg3',
+    'lot_seg4': 'lot_seg4',
+    'lot_seg5': 'lot_seg5',
+    'sale_order_ref': 'sale_order_ref',
+}
+# Clave del payload -> one2many de lineas normalizadas
+SESSION_LINE_KEYS = {
+    'components': 'component_ids',
+    'byproducts': 'byproduct_ids',
+    'assigned_lots': 'lot_line_ids',
+}
+
 
 class SimplifiedMrpSession(models.Model):
     _name = 'simplified.mrp.session'
@@ -19,6 +44,7 @@ class SimplifiedMrpSession(models.Model):
         ('confirmed', 'Confirmado'),
         ('cancelled', 'Cancelado'),
     ], default='draft', required=True, index=True)
+    active = fields.Boolean(default=True)
 
     warehouse_id = fields.Many2one('stock.warehouse')
     product_id = fields.Many2one('product.product')
@@ -35,49 +61,162 @@ class SimplifiedMrpSession(models.Model):
     lot_seg4 = fields.Char()
     lot_seg5 = fields.Char()
 
-    # JSON blobs for complex data
-    components_json = fields.Text(default='[]')
-    byproducts_json = fields.Text(default='[]')
-    assigned_lots_json = fields.Text(default='{}')
+    component_ids = fields.One2many('simplified.mrp.session.component', 'session_id')
+    byproduct_ids = fields.One2many('simplified.mrp.session.byproduct', 'session_id')
+    lot_line_ids = fields.One2many('simplified.mrp.session.lot', 'session_id')
     sale_order_ref = fields.Char()
 
     production_id = fields.Many2one('mrp.production', readonly=True)
+    # Control optimista de concurrencia: cada escritura efectiva lo incrementa
+    version = fields.Integer(default=1, required=True, readonly=True)
+
+    def init(self):
+        # Ruta caliente del autoguardado: borrador mas reciente del usuario
+        create_index(
+            self.env.cr, 'simplified_mrp_session_user_draft_idx', self._table,
+            ['user_id', 'write_date DESC'], where="state = 'draft'",
+        )
+
+    @api.model
+    def _normalize_scalar(self, key, value):
+        if key == 'product_qty':
+            return float(value if value is not None else 1.0)
+        if key == 'current_step':
+            return value or 'warehouse'
+        field = self._fields[SESSION_SCALAR_KEYS[key]]
+        if field.type == 'many2one':
+            return int(value) if value else False
+        return value or ''
+
+    def _changed_vals(self, data):
+        """
+        Valores a escribir para las claves presentes en `data` que realmente
+        cambian respecto de la sesion; sin sesion retorna todos.
+        """
+        vals = {}
+        for key, fname in SESSION_SCALAR_KEYS.items():
+            if key not in data:
+                continue
+            value = self._normalize_scalar(key, data[key])
+            current = self[fname]
+            if self and self._fields[fname].type == 'many2one':
+                current = current.id
+            if not self or current != value:
+                vals[fname] = value
+        for key, fname in SESSION_LINE_KEYS.items():
+            if key not in data:
+                continue
+            if key == 'assigned_lots':
+                commands = self._lot_line_commands(data[key])
+            elif key == 'components':
+                commands = _list_line_commands(self.component_ids, data[key], _component_vals)
+            else:
+                commands = _list_line_commands(self.byproduct_ids, data[key], _byproduct_vals)
+            if commands:
+                vals[fname] = commands
+        return vals
+
+    def _lot_line_commands(self, assigned):
+        """Comandos para llevar las lineas de lotes a {product_id: {lot_id: qty}}."""
+        desired = {}
+        for pid, lots in (assigned or {}).items():
+            for lid, qty in (lots or {}).items():
+                lid = int(lid)
+                desired[(int(pid), lid if lid > 0 else False)] = float(qty or 0.0)
+        commands = []
+        for line in self.lot_line_ids:
+            key = (line.product_id.id, line.lot_id.id)
+            if key not in desired:
+                commands.append(Command.delete(line.id))
+                continue
+            qty = desired.pop(key)
+            if line.qty != qty:
+                commands.append(Command.update(line.id, {'qty': qty}))
+        for (pid, lid), qty in desired.items():
+            commands.append(Command.create({'product_id': pid, 'lot_id': lid, 'qty': qty}))
+        return commands
+
+    def _lines_value(self, key):
+        """Valor de una clave de lineas en el formato del cliente."""
+        if key == 'components':
+            return [line._to_client() for line in self.component_ids]
+        if key == 'byproducts':
+            return [line._to_client() for line in self.byproduct_ids]
+        assigned = {}
+        for line in self.lot_line_ids:
+            lots = assigned.setdefault(str(line.product_id.id), {})
+            lots[str(line.lot_id.id or -1)] = line.qty
+        return assigned
 
     @api.model
     def save_session(self, data):
-        """Crea o actualiza la sesion borrador del usuario actual."""
+        """
+        Crea o actualiza la sesion borrador del usuario actual. Solo se
+        escriben los campos que cambiaron; retorna la version vigente.
+        """
         session = self.search([
             ('user_id', '=', self.env.uid),
             ('state', '=', 'draft'),
         ], limit=1, order='write_date desc')
 
-        vals = {
-            'warehouse_id': data.get('warehouse_id') or False,
-            'product_id': data.get('product_id') or False,
-            'product_qty': data.get('product_qty', 1.0),
-            'bom_id': data.get('bom_id') or False,
-            'origin': data.get('origin') or '',
-            'location_dest_id': data.get('location_dest_id') or False,
-            'current_step': data.get('current_step', 'warehouse'),
-            'lot_seg1': data.get('lot_seg1') or '',
-            'lot_seg2': data.get('lot_seg2') or '',
-            'lot_seg3': data.get('lot_seg3') or '',
-            'lot_seg4': data.get('lot_seg4') or '',
-            'lot_seg5': data.get('lot_seg5') or '',
-            'components_json': json.dumps(data.get('components', [])),
-            'byproducts_json': json.dumps(data.get('byproducts', [])),
-            'assigned_lots_json': json.dumps(data.get('assigned_lots', {})),
-            'sale_order_ref': data.get('sale_order_ref') or '',
-        }
-
         if session:
-            session.write(vals)
+            vals = session._changed_vals(data)
+            if vals:
+                vals['version'] = session.version + 1
+                session.write(vals)
         else:
+            vals = self._changed_vals(data)
             vals['user_id'] = self.env.uid
             vals['company_id'] = self.env.company.id
             session = self.create(vals)
 
-        return {'session_id': session.id}
+        return {'session_id': session.id, 'version': session.version}
+
+    @api.model
+    def patch_session(self, session_id, version, changes):
+        """
+        Aplica un diff sobre la sesion borrador `session_id`.
+
+        `changes` contiene solo las claves modificadas (mismas claves que
+        save_session) y, opcionalmente, `ops`: operaciones tipo JSON Patch
+        ('add', 'replace' o 'remove') sobre components/byproducts/assigned_lots,
+        p. ej. {'op': 'replace', 'path': '/assigned_lots/12', 'value': {'34': 2.5}}
+        ({lot_id: qty} del producto 12) o {'op': 'add', 'path': '/components/-',
+        'value': {...}}. Una operacion mal formada lanza UserError.
+
+        Si `version` no coincide con la guardada no se escribe nada y se
+        retorna {'conflict': True, 'version': <actual>}.
+        """
+        changes = dict(changes or {})
+        ops = changes.pop('ops', None) or []
+        _check_json_ops(ops)
+        self.flush_model(['version', 'state', 'user_id'])
+        self.env.cr.execute("""
+            SELECT version FROM simplified_mrp_session
+             WHERE id = %s AND user_id = %s AND state = 'draft'
+               FOR UPDATE
+        """, (int(session_id), self.env.uid))
+        row = self.env.cr.fetchone()
+        if not row:
+            return {'found': False, 'conflict': False}
+        if row[0] != int(version):
+            return {'found': True, 'conflict': True, 'version': row[0]}
+
+        session = self.browse(int(session_id))
+        if ops:
+            blobs = {}
+            for op in ops:
+                key = op['path'].strip('/').split('/')[0]
+                if key not in blobs:
+                    blobs[key] = changes[key] if key in changes else session._lines_value(key)
+                _apply_json_op(blobs[key], op)
+            changes.update(blobs)
+
+        vals = session._changed_vals(changes)
+        if vals:
+            vals['version'] = session.version + 1
+            session.write(vals)
+        return {'found': True, 'conflict': False, 'session_id': session.id, 'version': session.version}
 
     @api.model
     def load_session(self):
@@ -93,6 +232,7 @@ class SimplifiedMrpSession(models.Model):
         return {
             'found': True,
             'session_id': session.id,
+            'version': session.version,
             'warehouse_id': session.warehouse_id.id or False,
             'product_id': session.product_id.id or False,
             'product_name': session.product_id.display_name if session.product_id else '',
@@ -108,9 +248,9 @@ class SimplifiedMrpSession(models.Model):
             'lot_seg3': session.lot_seg3 or '',
             'lot_seg4': session.lot_seg4 or '',
             'lot_seg5': session.lot_seg5 or '',
-            'components': json.loads(session.components_json or '[]'),
-            'byproducts': json.loads(session.byproducts_json or '[]'),
-            'assigned_lots': json.loads(session.assigned_lots_json or '{}'),
+            'components': session._lines_value('components'),
+            'byproducts': session._lines_value('byproducts'),
+            'assigned_lots': session._lines_value('assigned_lots'),
             'sale_order_ref': session.sale_order_ref or '',
         }
 
@@ -136,4 +276,213 @@ class SimplifiedMrpSession(models.Model):
                 'state': 'confirmed',
                 'production_id': production_id or False,
             })
-        return True
\ No newline at end of file
+        return True
+
+    @api.model
+    def _cron_purge_sessions(self, batch_size=1000):
+        """
+        Elimina o archiva, por lotes, las sesiones confirmadas/canceladas mas
+        antiguas que la retencion configurada; se re-agenda si quedan mas.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        days = int(ICP.get_param('aq_simplified_mrp.session_retention_days', 90) or 0)
+        if days <= 0:
+            return
+        mode = ICP.get_param('aq_simplified_mrp.session_retention_mode', 'delete')
+        domain = [
+            ('state', 'in', ('confirmed', 'cancelled')),
+            ('write_date', '<', fields.Datetime.subtract(fields.Datetime.now(), days=days)),
+        ]
+        if mode == 'archive':
+            domain.append(('active', '=', True))
+        Session = self.with_context(active_test=False)
+        sessions = Session.search(domain, limit=batch_size, order='id')
+        if mode == 'archive':
+            sessions.write({'active': False})
+        else:
+            sessions.unlink()
+        remaining = Session.search_count(domain)
+        self.env['ir.cron']._notify_progress(done=len(sessions), remaining=remaining)
+
+    @api.model
+    def get_drafts_holding_lot(self, lot_id):
+        """Sesiones borrador (de cualquier usuario) con el lote asignado."""
+        if not self.env.user.has_group('aq_simplified_mrp.group_simplified_mrp_supervisor'):
+            raise UserError(_('No tienes permiso para consultar sesiones de otros usuarios'))
+        lines = self.env['simplified.mrp.session.lot'].sudo().search([
+            ('lot_id', '=', int(lot_id)),
+            ('session_id.state', '=', 'draft'),
+        ])
+        return [{
+            'session_id': line.session_id.id,
+            'user_name': line.session_id.user_id.name,
+            'product_name': line.session_id.product_id.display_name or '',
+            'component_name': line.product_id.display_name,
+            'qty': line.qty,
+            'write_date': line.session_id.write_date.isoformat() if line.session_id.write_date else False,
+        } for line in lines]
+
+
+class SimplifiedMrpSessionComponent(models.Model):
+    _name = 'simplified.mrp.session.component'
+    _description = 'Componente de sesion MRP simplificada'
+    _order = 'session_id, sequence, id'
+
+    session_id = fields.Many2one('simplified.mrp.session', required=True, index=True, ondelete='cascade')
+    sequence = fields.Integer(default=10)
+    product_id = fields.Many2one('product.product', required=True, index=True)
+    uom_id = fields.Many2one('uom.uom')
+    qty_formula = fields.Float()
+    qty_real = fields.Float()
+
+    def _to_client(self):
+        uom = self.uom_id or self.product_id.uom_id
+        return {
+            'product_id': self.product_id.id,
+            'name': self.product_id.display_name,
+            'uom_id': uom.id,
+            'uom_name': uom.name,
+            'qty_formula': self.qty_formula,
+            'qty_real': self.qty_real,
+            'tracking': self.product_id.tracking,
+        }
+
+
+class SimplifiedMrpSessionByproduct(models.Model):
+    _name = 'simplified.mrp.session.byproduct'
+    _description = 'Subproducto de sesion MRP simplificada'
+    _order = 'session_id, sequence, id'
+
+    session_id = fields.Many2one('simplified.mrp.session', required=True, index=True, ondelete='cascade')
+    sequence = fields.Integer(default=10)
+    product_id = fields.Many2one('product.product', required=True, index=True)
+    uom_id = fields.Many2one('uom.uom')
+    qty = fields.Float()
+
+    def _to_client(self):
+        uom = self.uom_id or self.product_id.uom_id
+        return {
+            'product_id': self.product_id.id,
+            'name': self.product_id.display_name,
+            'uom_id': uom.id,
+            'uom_name': uom.name,
+            'qty': self.qty,
+        }
+
+
+class SimplifiedMrpSessionLot(models.Model):
+    _name = 'simplified.mrp.session.lot'
+    _description = 'Lote asignado en sesion MRP simplificada'
+    _order = 'session_id, product_id, id'
+
+    session_id = fields.Many2one('simplified.mrp.session', required=True, index=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', required=True, index=True)
+    # Vacio = "Sin lote / General"
+    lot_id = fields.Many2one('stock.lot', index='btree_not_null', ondelete='cascade')
+    qty = fields.Float()
+
+
+def _component_vals(item):
+    return {
+        'product_id': int(item['product_id']),
+        'uom_id': int(item['uom_id']) if item.get('uom_id') else False,
+        'qty_formula': float(item.get('qty_formula') or 0.0),
+        'qty_real': float(item.get('qty_real') or 0.0),
+    }
+
+
+def _byproduct_vals(item):
+    return {
+        'product_id': int(item['product_id']),
+        'uom_id': int(item['uom_id']) if item.get('uom_id') else False,
+        'qty': float(item.get('qty') or 0.0),
+    }
+
+
+def _list_line_commands(lines, items, to_vals):
+    """
+    Comandos para llevar `lines` (ordenadas) a la lista `items` por posicion:
+    solo se actualizan las filas cuyo valor cambia.
+    """
+    items = [item for item in (items or []) if item and item.get('product_id')]
+    commands = []
+    for sequence, (line, item) in enumerate(zip_longest(lines, items)):
+        if item is None:
+            commands.append(Command.delete(line.id))
+            continue
+        vals = dict(to_vals(item), sequence=sequence)
+        if line is None:
+            commands.append(Command.create(vals))
+            continue
+        changed = {}
+        for fname, value in vals.items():
+            current = line[fname]
+            if line._fields[fname].type == 'many2one':
+                current = current.id
+            if current != value:
+                changed[fname] = value
+        if changed:
+            commands.append(Command.update(line.id, changed))
+    return commands
+
+
+def _check_json_ops(ops):
+    """Valida la forma de las operaciones antes de tocar la sesion."""
+    if not isinstance(ops, list):
+        raise UserError(_('Las operaciones del parche deben ser una lista.'))
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in ('add', 'replace', 'remove'):
+            raise UserError(_('Operacion de parche invalida: %s') % (op,))
+        path = op.get('path')
+        parts = path.strip('/').split('/') if isinstance(path, str) and path.startswith('/') else []
+        if len(parts) < 2 or parts[0] not in SESSION_LINE_KEYS or not all(parts[1:]):
+            raise UserError(_('Ruta de parche invalida: %s') % (path,))
+        if op['op'] == 'remove':
+            continue
+        if 'value' not in op:
+            raise UserError(_('La operacion %(op)s sobre %(path)s requiere un valor.', op=op['op'], path=path))
+        # Un elemento completo: linea (dict) o lotes de un producto ({lot_id: qty})
+        if len(parts) == 2 and not isinstance(op['value'], dict):
+            raise UserError(_('Valor de parche invalido para %s') % path)
+
+
+def _json_index(part, size, allow_end=False):
+    """Indice de lista de una ruta JSON Pointer: entero no negativo dentro del rango."""
+    if not part.isdigit() or int(part) > size or (int(part) == size and not allow_end):
+        raise UserError(_('Indice de parche fuera de rango: %s') % part)
+    return int(part)
+
+
+def _apply_json_op(doc, op):
+    """
+    Aplica una operacion add/replace/remove (ruta JSON Pointer) sobre `doc`
+    in-place. Los indices de lista deben existir ('-' solo para add al
+    final); en los diccionarios add/replace asignan y remove ignora claves
+    ausentes.
+    """
+    parts = [p.replace('~1', '/').replace('~0', '~') for p in op['path'].strip('/').split('/')[1:]]
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[_json_index(part, len(target))]
+        elif isinstance(target, dict):
+            target = target.setdefault(part, {})
+        else:
+            raise UserError(_('Ruta de parche invalida: %s') % op['path'])
+    last = parts[-1]
+    kind = op['op']
+    if isinstance(target, list):
+        if kind == 'add' and last == '-':
+            target.append(op['value'])
+        elif kind == 'add':
+            target.insert(_json_index(last, len(target), allow_end=True), op['value'])
+        elif kind == 'replace':
+            target[_json_index(last, len(target))] = op['value']
+        else:
+            del target[_json_index(last, len(target))]
+    elif not isinstance(target, dict):
+        raise UserError(_('Ruta de parche invalida: %s') % op['path'])
+    elif kind in ('add', 'replace'):
+        target[last] = op['value']
+    else:
+        target.pop(last, None)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Campos que alteran el conjunto de ubicaciones internas de un almacen
+LOCATION_TREE_FIELDS = {'location_id', 'usage', 'active', 'company_id'}
+WAREHOUSE_TREE_FIELDS = {'view_location_id', 'active', 'company_id'}
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        locations = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return locations
+
+    def write(self, vals):
+        res = super().write(vals)
+        if LOCATION_TREE_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+
+class StockWarehouse(models.Model):
+    _inherit = 'stock.warehouse'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        warehouses = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return warehouses
+
+    def write(self, vals):
+        res = super().write(vals)
+        if WAREHOUSE_TREE_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -13,6 +13,8 @@ class SimplifiedMrp extends Component {
         this.action = useService('action');
         this.notification = useService('notification');
 
+        this._savedSnapshot = null;
+        this._prefill = null;
         this.state = useState({
             view: 'create',
             step: 'warehouse',
@@ -42,6 +44,7 @@ class SimplifiedMrp extends Component {
             saleOrderQuery: '',
             saleOrderResults: [],
             selectedSaleOrder: null,
+            saleOrderLines: [],
             destLocations: [],
             selectedDestLocation: null,
 
@@ -66,7 +69,11 @@ class SimplifiedMrp extends Component {
 
             // Step 4: Lots
             lots: [],
+            lotsCursor: false,
+            lotsByProduct: {},
             lotQuery: '',
+            lotPolicy: 'fefo',
+            autoAllocating: false,
             assignedLots: {},
             compIndex: 0,
 
@@ -80,15 +87,20 @@ class SimplifiedMrp extends Component {
             resultMoState: '',
             needsForceValidate: false,
             completionError: '',
+            completionPending: false,
             forceValidating: false,
 
             // List / Detail
             myProductions: [],
+            myProductionsCursor: false,
+            myProductionsSyncedAt: false,
             selectedMo: null,
             moDetail: null,
 
             // Persistence
             hasRecoverableSession: false,
+            sessionId: null,
+            sessionVersion: 0,
             saving: false,
             lastSavedAt: null,
 
@@ -97,10 +109,7 @@ class SimplifiedMrp extends Component {
         });
 
         onWillStart(async () => {
-            await this.loadConfig();
-            await this.loadWarehouses();
-            await this.loadMyProductions();
-            await this.checkRecoverableSession();
+            await this.loadBootstrap();
         });
     }
 
@@ -235,35 +244,33 @@ class SimplifiedMrp extends Component {
     // ═══════════════════════════════════════════════════════════════════════
     // CONFIG
     // ═══════════════════════════════════════════════════════════════════════
-    async loadConfig() {
+    async loadBootstrap() {
+        // Una sola llamada al abrir: config, borrador, almacenes y mis ordenes
         try {
-            const cfg = await this.orm.call('aq.simplified.mrp.api', 'get_mrp_config', [], {});
-            this.state.autoLot = cfg.auto_lot === true;
-            this.state.toleranceGreen = cfg.tolerance_green || 2;
-            this.state.toleranceYellow = cfg.tolerance_yellow || 10;
-            this.state.toleranceOrange = cfg.tolerance_orange || 25;
-            this.state.allowConfirmRed = cfg.allow_confirm_red !== false;
-            this.state.autoCreateBom = cfg.auto_create_bom !== false;
-            this.state.autosave = cfg.autosave !== false;
+            const data = await this.orm.call('aq.simplified.mrp.api', 'get_bootstrap_data', [], {});
+            this.applyConfig(data.config || {});
+            this.state.warehouses = data.warehouses || [];
+            this.applyProductionsPage(data.productions || {}, false);
+            const session = data.session || {};
+            this.state.hasRecoverableSession = !!(session.found && session.current_step !== 'warehouse');
         } catch (e) {
-            console.warn('[SMRP] Config load failed, using defaults', e);
+            this.notifyError('Error cargando datos iniciales', e);
         }
     }
 
+    applyConfig(cfg) {
+        this.state.autoLot = cfg.auto_lot === true;
+        this.state.toleranceGreen = cfg.tolerance_green || 2;
+        this.state.toleranceYellow = cfg.tolerance_yellow || 10;
+        this.state.toleranceOrange = cfg.tolerance_orange || 25;
+        this.state.allowConfirmRed = cfg.allow_confirm_red !== false;
+        this.state.autoCreateBom = cfg.auto_create_bom !== false;
+        this.state.autosave = cfg.autosave !== false;
+    }
+
     // ═══════════════════════════════════════════════════════════════════════
     // PERSISTENCE
     // ═══════════════════════════════════════════════════════════════════════
-    async checkRecoverableSession() {
-        try {
-            const res = await this.orm.call('simplified.mrp.session', 'load_session', [], {});
-            if (res.found && res.current_step !== 'warehouse') {
-                this.state.hasRecoverableSession = true;
-            }
-        } catch (e) {
-            console.warn('[SMRP] Session check failed', e);
-        }
-    }
-
     async recoverSession() {
         try {
             const res = await this.orm.call('simplified.mrp.session', 'load_session', [], {});
@@ -291,6 +298,9 @@ class SimplifiedMrp extends Component {
             this.state.assignedLots = res.assigned_lots || {};
             this.state.step = res.current_step || 'warehouse';
             this.state.hasRecoverableSession = false;
+            this.state.sessionId = res.session_id;
+            this.state.sessionVersion = res.version;
+            this._savedSnapshot = this._sessionSnapshot();
 
             if (this.state.warehouseId) await this.loadDestLocations();
 
@@ -304,35 +314,90 @@ class SimplifiedMrp extends Component {
         try {
             await this.orm.call('simplified.mrp.session', 'discard_session', [], {});
             this.state.hasRecoverableSession = false;
+            this.state.sessionId = null;
+            this._savedSnapshot = null;
             this.notification.add('Sesion descartada', { type: 'info' });
         } catch (e) {
             console.warn('[SMRP] Discard session error', e);
         }
     }
 
+    _sessionSnapshot() {
+        // Copia profunda: el estado reactivo se muta en sitio
+        return JSON.parse(JSON.stringify({
+            warehouse_id: this.state.warehouseId,
+            product_id: this.state.productId,
+            product_qty: this.toNum(this.state.qty),
+            bom_id: this.state.bomId,
+            origin: this.state.saleOrderQuery || '',
+            location_dest_id: this.state.selectedDestLocation?.id || false,
+            current_step: this.state.step,
+            lot_seg1: this.state.lotSeg1,
+            lot_seg2: this.state.lotSeg2,
+            lot_seg3: this.state.lotSeg3,
+            lot_seg4: this.state.lotSeg4,
+            lot_seg5: this.state.lotSeg5,
+            components: this.state.components,
+            byproducts: this.state.byproducts,
+            assigned_lots: this.state.assignedLots,
+            sale_order_ref: this.state.saleOrderQuery || '',
+        }));
+    }
+
+    _sessionDiff(prev, next) {
+        // Claves escalares y listas que cambiaron; lotes asignados como
+        // operaciones por producto para no reenviar el mapa completo.
+        const changes = {};
+        const ops = [];
+        for (const key of Object.keys(next)) {
+            if (key === 'assigned_lots') continue;
+            if (JSON.stringify(prev[key]) !== JSON.stringify(next[key])) changes[key] = next[key];
+        }
+        const before = prev.assigned_lots || {};
+        const after = next.assigned_lots || {};
+        for (const pid of Object.keys(after)) {
+            if (!(pid in before)) {
+                ops.push({ op: 'add', path: `/assigned_lots/${pid}`, value: after[pid] });
+            } else if (JSON.stringify(before[pid]) !== JSON.stringify(after[pid])) {
+                ops.push({ op: 'replace', path: `/assigned_lots/${pid}`, value: after[pid] });
+            }
+        }
+        for (const pid of Object.keys(before)) {
+            if (!(pid in after)) ops.push({ op: 'remove', path: `/assigned_lots/${pid}` });
+        }
+        if (ops.length) changes.ops = ops;
+        return Object.keys(changes).length ? changes : null;
+    }
+
+    async _saveFullSession(snapshot) {
+        const res = await this.orm.call('simplified.mrp.session', 'save_session', [snapshot], {});
+        this.state.sessionId = res.session_id;
+        this.state.sessionVersion = res.version;
+    }
+
     async autoSave() {
         if (!this.state.autosave) return;
         if (this.state.step === 'warehouse' || this.state.step === 'done') return;
+        const snapshot = this._sessionSnapshot();
         try {
             this.state.saving = true;
-            await this.orm.call('simplified.mrp.session', 'save_session', [{
-                warehouse_id: this.state.warehouseId,
-                product_id: this.state.productId,
-                product_qty: this.toNum(this.state.qty),
-                bom_id: this.state.bomId,
-                origin: this.state.saleOrderQuery || '',
-                location_dest_id: this.state.selectedDestLocation?.id || false,
-                current_step: this.state.step,
-                lot_seg1: this.state.lotSeg1,
-                lot_seg2: this.state.lotSeg2,
-                lot_seg3: this.state.lotSeg3,
-                lot_seg4: this.state.lotSeg4,
-                lot_seg5: this.state.lotSeg5,
-                components: this.state.components,
-                byproducts: this.state.byproducts,
-                assigned_lots: this.state.assignedLots,
-                sale_order_ref: this.state.saleOrderQuery || '',
-            }], {});
+            if (this.state.sessionId && this._savedSnapshot) {
+                const changes = this._sessionDiff(this._savedSnapshot, snapshot);
+                if (changes) {
+                    const res = await this.orm.call('simplified.mrp.session', 'patch_session',
+                        [this.state.sessionId, this.state.sessionVersion, changes], {});
+                    if (res.found && !res.conflict) {
+                        this.state.sessionVersion = res.version;
+                    } else {
+                        // Otra ventana modifico (o cerro) la sesion: se guarda el estado completo
+                        if (res.conflict) console.warn('[SMRP] Session version conflict, saving full state');
+                        await this._saveFullSession(snapshot);
+                    }
+                }
+            } else {
+                await this._saveFullSession(snapshot);
+            }
+            this._savedSnapshot = snapshot;
             this.state.lastSavedAt = new Date().toLocaleTimeString();
             this.state.saving = false;
         } catch (e) {
@@ -344,12 +409,6 @@ class SimplifiedMrp extends Component {
     // ═══════════════════════════════════════════════════════════════════════
     // DATA LOADERS
     // ═══════════════════════════════════════════════════════════════════════
-    async loadWarehouses() {
-        try {
-            this.state.warehouses = await this.orm.call('aq.simplified.mrp.api', 'get_warehouses', [], {});
-        } catch (e) { this.notifyError('Error cargando almacenes', e); }
-    }
-
     async loadDestLocations() {
         if (!this.state.warehouseId) return;
         try {
@@ -359,12 +418,70 @@ class SimplifiedMrp extends Component {
         } catch (e) { console.error('Error cargando ubicaciones:', e); }
     }
 
+    applyProductionsPage(page, append) {
+        const rows = page.productions || [];
+        if (append) {
+            // Una orden modificada entre paginas puede llegar dos veces
+            const known = new Set(this.state.myProductions.map(mo => mo.id));
+            this.state.myProductions = [...this.state.myProductions, ...rows.filter(mo => !known.has(mo.id))];
+        } else {
+            this.state.myProductions = rows;
+        }
+        this.state.myProductionsCursor = page.next_cursor || false;
+        this.state.myProductionsSyncedAt = page.synced_at || false;
+    }
+
     async loadMyProductions() {
+        // Con una sincronizacion previa solo se piden las ordenes modificadas
+        if (this.state.myProductionsSyncedAt) return this.refreshMyProductions();
         try {
-            this.state.myProductions = await this.orm.call('aq.simplified.mrp.api', 'get_my_productions', [50], {});
+            const page = await this.orm.call(
+                'aq.simplified.mrp.api', 'get_my_productions_page', [], { limit: 50 }
+            );
+            this.applyProductionsPage(page, false);
         } catch (e) { this.notifyError('Error cargando mis ordenes', e); }
     }
 
+    async loadMoreProductions() {
+        if (!this.state.myProductionsCursor) return;
+        try {
+            const page = await this.orm.call(
+                'aq.simplified.mrp.api', 'get_my_productions_page', [],
+                { limit: 50, cursor: this.state.myProductionsCursor }
+            );
+            const syncedAt = this.state.myProductionsSyncedAt;
+            this.applyProductionsPage(page, true);
+            this.state.myProductionsSyncedAt = syncedAt;
+        } catch (e) { this.notifyError('Error cargando mis ordenes', e); }
+    }
+
+    async refreshMyProductions() {
+        try {
+            // Se recorren todas las paginas de cambios; synced_at de la primera
+            // cubre lo escrito mientras se leian las siguientes
+            const since = this.state.myProductionsSyncedAt;
+            const changed = [];
+            let syncedAt = false;
+            let cursor = false;
+            do {
+                const page = await this.orm.call(
+                    'aq.simplified.mrp.api', 'get_my_productions_page', [],
+                    { limit: 200, since_write_date: since, cursor }
+                );
+                changed.push(...(page.productions || []));
+                syncedAt = syncedAt || page.synced_at;
+                cursor = page.next_cursor || false;
+            } while (cursor);
+            const byId = new Map(changed.map(mo => [mo.id, mo]));
+            const kept = this.state.myProductions.map(mo => byId.get(mo.id) || mo);
+            const known = new Set(kept.map(mo => mo.id));
+            const added = [...byId.values()].filter(mo => !known.has(mo.id));
+            this.state.myProductions = [...added, ...kept].sort((a, b) =>
+                (b.date_start || '').localeCompare(a.date_start || '') || b.id - a.id);
+            this.state.myProductionsSyncedAt = syncedAt || this.state.myProductionsSyncedAt;
+        } catch (e) { this.notifyError('Error actualizando mis ordenes', e); }
+    }
+
     async loadMoDetail(moId) {
         try {
             this.state.moDetail = await this.orm.call('aq.simplified.mrp.api', 'get_production_detail', [moId], {});
@@ -395,6 +512,22 @@ class SimplifiedMrp extends Component {
         } catch (e) { this.notifyError('Error buscando ingredientes', e); }
     }
 
+    async scanComponent() {
+        // Lectores de codigo envian Enter: resolucion exacta en lugar de ilike
+        const code = (this.state.compSearchQuery || '').trim();
+        if (!code) return;
+        try {
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'resolve_scan',
+                [code, this.state.warehouseId, 'components'], {}
+            );
+            if (!res.found) {
+                this.notification.add(`Codigo no encontrado: ${code}`, { type: 'warning' }); return;
+            }
+            this.addComponentFromSearch(res.match.product);
+        } catch (e) { this.notifyError('Error resolviendo codigo', e); }
+    }
+
     async searchByproducts() {
         if (!this.state.bpSearchQuery) { this.state.bpSearchResults = []; return; }
         try {
@@ -437,10 +570,39 @@ class SimplifiedMrp extends Component {
         this.state.products = [];
     }
 
-    selectSaleOrder(so) {
+    async selectSaleOrder(so) {
         this.state.selectedSaleOrder = so;
         this.state.saleOrderQuery = so.name;
         this.state.saleOrderResults = [];
+        try {
+            // Lineas fabricables con BOM, componentes y lotes en una llamada
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'prefill_from_sale_order',
+                [so.id, this.state.warehouseId], {}
+            );
+            this.state.saleOrderLines = res.lines || [];
+            this._prefill = { lines: this.state.saleOrderLines, lots: res.lots_by_product || {} };
+            if (res.skipped?.length) {
+                this.notification.add(`Sin lista de materiales: ${res.skipped.join(', ')}`, { type: 'info' });
+            }
+            if (this.state.saleOrderLines.length === 1) this.applySaleOrderLine(this.state.saleOrderLines[0]);
+        } catch (e) {
+            this.state.saleOrderLines = [];
+            this._prefill = null;
+            console.warn('[SMRP] Sale order prefill failed', e);
+        }
+    }
+
+    applySaleOrderLine(line) {
+        this.selectProduct(line.product);
+        this.state.qty = line.qty;
+    }
+
+    _prefilledComponents() {
+        // Componentes de la linea de venta aplicada, si coinciden producto y cantidad
+        const line = (this._prefill?.lines || []).find(l =>
+            l.product.id === this.state.productId && l.qty === this.toNum(this.state.qty));
+        return line || null;
     }
 
     async confirmProductAndConfig() {
@@ -488,10 +650,13 @@ class SimplifiedMrp extends Component {
     // ═══════════════════════════════════════════════════════════════════════
     async _loadComponents() {
         try {
-            const res = await this.orm.call(
-                'aq.simplified.mrp.api', 'get_bom_components',
-                [this.state.productId, this.state.qty], {}
-            );
+            const line = this._prefilledComponents();
+            const res = line
+                ? { bom_id: line.bom_id, bom_exists: true, components: line.components }
+                : await this.orm.call(
+                    'aq.simplified.mrp.api', 'get_bom_components',
+                    [this.state.productId, this.state.qty], {}
+                );
             this.state.bomId = res.bom_id || null;
             this.state.bomExists = res.bom_exists || false;
             this.state.components = (res.components || []).map(c => ({
@@ -586,6 +751,7 @@ class SimplifiedMrp extends Component {
     async continueFromByproducts() {
         this.state.compIndex = 0;
         this.state.step = 'lots';
+        await this.loadLotsBulk();
         await this.loadLotsForCurrent();
         await this.autoSave();
     }
@@ -595,16 +761,38 @@ class SimplifiedMrp extends Component {
     // ═══════════════════════════════════════════════════════════════════════
     // STEP 4: LOTS
     // ═══════════════════════════════════════════════════════════════════════
+    async loadLotsBulk() {
+        // Lotes ya traidos con la orden de venta no se vuelven a pedir
+        const prefilled = this._prefill?.lots || {};
+        const productIds = this.state.components.map(c => c.product_id).filter(pid => !prefilled[pid]);
+        this.state.lotsByProduct = { ...prefilled };
+        if (!productIds.length) return;
+        try {
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'get_lots_bulk',
+                [productIds, this.state.warehouseId],
+                { limit: 60 }
+            );
+            this.state.lotsByProduct = { ...prefilled, ...res };
+        } catch (e) { this.notifyError('Error cargando lotes', e); }
+    }
+
     async loadLotsForCurrent() {
         const comp = this.state.components[this.state.compIndex];
         if (!comp) return;
         this.state.lotQuery = '';
         try {
-            this.state.lots = await this.orm.call(
-                'aq.simplified.mrp.api', 'get_lots',
-                [comp.product_id, this.state.warehouseId],
-                { limit: 60, query: '' }
-            );
+            let res = this.state.lotsByProduct[comp.product_id];
+            if (!res) {
+                res = await this.orm.call(
+                    'aq.simplified.mrp.api', 'get_lots_page',
+                    [comp.product_id, this.state.warehouseId],
+                    { limit: 60, query: '' }
+                );
+                this.state.lotsByProduct[comp.product_id] = res;
+            }
+            this.state.lots = res.lots || [];
+            this.state.lotsCursor = res.next_cursor || false;
             if (!this.state.assignedLots[comp.product_id])
                 this.state.assignedLots[comp.product_id] = {};
         } catch (e) { this.notifyError('Error cargando lotes', e); }
@@ -614,14 +802,59 @@ class SimplifiedMrp extends Component {
         const comp = this.state.components[this.state.compIndex];
         if (!comp) return;
         try {
-            this.state.lots = await this.orm.call(
-                'aq.simplified.mrp.api', 'get_lots',
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'get_lots_page',
                 [comp.product_id, this.state.warehouseId],
                 { limit: 60, query: this.state.lotQuery || '' }
             );
+            this.state.lots = res.lots || [];
+            this.state.lotsCursor = res.next_cursor || false;
         } catch (e) { this.notifyError('Error buscando lotes', e); }
     }
 
+    async scanLot() {
+        const comp = this.state.components[this.state.compIndex];
+        const code = (this.state.lotQuery || '').trim();
+        if (!comp || !code) return;
+        try {
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'resolve_scan',
+                [code, this.state.warehouseId, 'lots'], {}
+            );
+            const match = (res.matches || []).find(m => m.lot && m.product.id === comp.product_id);
+            if (!match) {
+                this.notification.add(`El lote ${code} no corresponde a ${comp.name}`, { type: 'warning' }); return;
+            }
+            if (!this.state.lots.find(l => l.id === match.lot.id)) {
+                this.state.lots = [
+                    { id: match.lot.id, name: match.lot.name, qty_available: match.qty_available },
+                    ...this.state.lots,
+                ];
+            }
+            this.fillRemainingLot(match.lot.id);
+            this.state.lotQuery = '';
+        } catch (e) { this.notifyError('Error resolviendo lote', e); }
+    }
+
+    async loadMoreLots() {
+        const comp = this.state.components[this.state.compIndex];
+        if (!comp || !this.state.lotsCursor) return;
+        try {
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'get_lots_page',
+                [comp.product_id, this.state.warehouseId],
+                { limit: 60, query: this.state.lotQuery || '', cursor: this.state.lotsCursor }
+            );
+            this.state.lots = [...this.state.lots, ...(res.lots || [])];
+            this.state.lotsCursor = res.next_cursor || false;
+            if (!this.state.lotQuery) {
+                this.state.lotsByProduct[comp.product_id] = {
+                    lots: this.state.lots, next_cursor: this.state.lotsCursor,
+                };
+            }
+        } catch (e) { this.notifyError('Error cargando mas lotes', e); }
+    }
+
     getAssignedTotal(productId) {
         return Object.values(this.state.assignedLots[productId] || {})
             .reduce((s, v) => s + this.toNum(v), 0);
@@ -678,6 +911,42 @@ class SimplifiedMrp extends Component {
         this.state.assignedLots = { ...this.state.assignedLots };
     }
 
+    async autoAllocateLots() {
+        // Reparto sugerido para todos los componentes en una sola llamada
+        this.state.autoAllocating = true;
+        try {
+            const res = await this.orm.call(
+                'aq.simplified.mrp.api', 'auto_allocate_lots',
+                [this.state.warehouseId,
+                    this.state.components.map(c => ({ product_id: c.product_id, qty_real: this.toNum(c.qty_real) })),
+                    this.state.lotPolicy],
+                {}
+            );
+            this.state.assignedLots = { ...this.state.assignedLots, ...(res.assigned_lots || {}) };
+            // Lotes asignados fuera de la primera pagina deben verse en la lista
+            for (const [pid, used] of Object.entries(res.lots || {})) {
+                const page = this.state.lotsByProduct[pid];
+                if (!page) continue;
+                const known = new Set(page.lots.map(l => l.id));
+                page.lots = [...used.filter(l => !known.has(l.id)), ...page.lots];
+            }
+            const comp = this.state.components[this.state.compIndex];
+            const current = comp && this.state.lotsByProduct[comp.product_id];
+            if (current) this.state.lots = current.lots;
+            const short = Object.keys(res.shortages || {}).length;
+            if (short) {
+                this.notification.add(`Stock insuficiente para ${short} componente(s); revisa las cantidades`, { type: 'warning' });
+            } else {
+                this.notification.add('Lotes asignados automaticamente', { type: 'success' });
+            }
+            await this.autoSave();
+        } catch (e) {
+            this.notifyError('Error asignando lotes', e);
+        } finally {
+            this.state.autoAllocating = false;
+        }
+    }
+
     fillRemainingLot(lotId) {
         const comp = this.state.components[this.state.compIndex];
         if (!comp) return;
@@ -802,9 +1071,13 @@ class SimplifiedMrp extends Component {
             this.state.resultMoState = res.state || '';
             this.state.needsForceValidate = res.needs_force_validate || false;
             this.state.completionError = res.completion_error || '';
+            this.state.completionPending = res.completion_pending || false;
             this.state.step = 'done';
 
-            if (res.completed) {
+            if (res.completion_pending) {
+                this.notification.add('Orden creada; el cierre se completa en segundo plano', { type: 'info' });
+                this.pollCompletion(res.mo_id);
+            } else if (res.completed) {
                 this.notification.add('Orden de produccion creada y validada exitosamente', { type: 'success' });
             } else {
                 this.notification.add(
@@ -821,6 +1094,44 @@ class SimplifiedMrp extends Component {
         }
     }
 
+    // ═══════════════════════════════════════════════════════════════════════
+    // DEFERRED COMPLETION (polling)
+    // ═══════════════════════════════════════════════════════════════════════
+    async pollCompletion(moId, attempt = 0) {
+        if (this.state.resultMoId !== moId || !this.state.completionPending) return;
+        if (attempt >= 40) {
+            this.state.completionPending = false;
+            this.state.needsForceValidate = true;
+            return;
+        }
+        await new Promise(resolve => setTimeout(resolve, 3000));
+        if (this.state.resultMoId !== moId) return;
+        try {
+            const [st] = await this.orm.call(
+                'aq.simplified.mrp.api', 'get_completion_status', [[moId]], {}
+            );
+            if (st && !st.pending) {
+                this.state.completionPending = false;
+                this.state.resultMoState = st.state;
+                this.state.needsForceValidate = st.needs_force_validate || !st.completed;
+                this.state.completionError = st.error_detail || '';
+                if (st.completed) {
+                    this.notification.add('Orden de produccion validada exitosamente', { type: 'success' });
+                } else {
+                    this.notification.add(
+                        `La orden NO se pudo marcar como hecha (estado: ${st.state}). Usa el boton "Forzar validacion".`,
+                        { type: 'warning', sticky: true }
+                    );
+                }
+                await this.loadMyProductions();
+                return;
+            }
+        } catch (e) {
+            console.warn('[SMRP] Completion status poll failed', e);
+        }
+        return this.pollCompletion(moId, attempt + 1);
+    }
+
     // ═══════════════════════════════════════════════════════════════════════
     // FORCE VALIDATE (retry)
     // ═══════════════════════════════════════════════════════════════════════
@@ -834,6 +1145,7 @@ class SimplifiedMrp extends Component {
             );
             if (res.success) {
                 this.state.needsForceValidate = false;
+                this.state.completionPending = false;
                 this.state.resultMoState = 'done';
                 this.state.completionError = '';
                 this.notification.add(res.message, { type: 'success' });
@@ -866,20 +1178,23 @@ class SimplifiedMrp extends Component {
             view: 'create', step: 'warehouse', warehouseId: null,
             productId: null, productName: '', qty: 1.0,
             productTracking: 'none', productHasBom: false,
-            saleOrderQuery: '', saleOrderResults: [], selectedSaleOrder: null,
+            saleOrderQuery: '', saleOrderResults: [], selectedSaleOrder: null, saleOrderLines: [],
             selectedDestLocation: null, products: [],
             lotSeg1: '', lotSeg2: '', lotSeg3: '', lotSeg4: '', lotSeg5: '',
             lotPreview: '', lotSegErrors: { s1: false, s2: false, s3: false, s4: false, s5: false },
             components: [], byproducts: [], assignedLots: {},
             compIndex: 0, bomId: null, bomExists: false,
-            lotQuery: '', resultMoId: null, resultMoName: '', bomMessage: '',
+            lotQuery: '', lotPolicy: 'fefo', autoAllocating: false, lotsCursor: false, lotsByProduct: {}, resultMoId: null, resultMoName: '', bomMessage: '',
             resultMoState: '', needsForceValidate: false, completionError: '',
-            forceValidating: false,
+            completionPending: false, forceValidating: false,
             compSearchQuery: '', compSearchResults: [], newCompQty: 1.0,
             bpSearchQuery: '', bpSearchResults: [], newBpQty: 1.0,
             reviewWarnings: [], submitting: false,
             hasRecoverableSession: false, saving: false, lastSavedAt: null,
+            sessionId: null, sessionVersion: 0,
         });
+        this._savedSnapshot = null;
+        this._prefill = null;
     }
 
     // ═══════════════════════════════════════════════════════════════════════
@@ -0,0 +1,8 @@
+from . import test_performance
+from . import test_session
+from . import test_lot_counter
+from . import test_lot_paging
+from . import test_bom_explosion
+from . import test_auto_allocate
+from . import test_lot_genealogy
+from . import test_tolerances
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase
+
+
+class SimplifiedMrpCase(TransactionCase):
+    """Datos minimos compartidos: almacen, productos con lote, BOM y stock."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.api = cls.env['aq.simplified.mrp.api']
+        cls.warehouse = cls.env.ref('stock.warehouse0')
+        cls.stock_location = cls.warehouse.lot_stock_id
+
+    @classmethod
+    def _product(cls, name, code=None, tracking='lot'):
+        Product = cls.env['product.product']
+        vals = {'name': name, 'default_code': code, 'type': 'consu', 'tracking': tracking}
+        if 'is_storable' in Product._fields:
+            vals['is_storable'] = True
+        return Product.create(vals)
+
+    @classmethod
+    def _lot(cls, product, name, qty=0.0, location=None, **vals):
+        lot = cls.env['stock.lot'].create(dict(vals, **{
+            'name': name,
+            'product_id': product.id,
+            'company_id': cls.env.company.id,
+        }))
+        if qty:
+            cls.env['stock.quant']._update_available_quantity(
+                product, location or cls.stock_location, qty, lot_id=lot,
+            )
+        return lot
+
+    @classmethod
+    def _bom(cls, product, lines, product_qty=1.0):
+        """`lines`: [(producto, cantidad)]."""
+        return cls.env['mrp.bom'].create({
+            'product_tmpl_id': product.product_tmpl_id.id,
+            'product_id': product.id,
+            'product_qty': product_qty,
+            'bom_line_ids': [(0, 0, {
+                'product_id': comp.id,
+                'product_qty': qty,
+                'product_uom_id': comp.uom_id.id,
+            }) for comp, qty in lines],
+        })
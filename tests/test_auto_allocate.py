@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from odoo.tests import tagged
+
+from .common import SimplifiedMrpCase
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpAutoAllocate(SimplifiedMrpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.component = cls._product('SMRP Asignacion Componente', 'SMRPASG')
+        cls.has_expiry = 'expiration_date' in cls.env['stock.lot']._fields
+        Quant = cls.env['stock.quant']
+        # (nombre, cantidad, reservado, entrada, caducidad)
+        spec = [
+            ('ASG-A', 10.0, 4.0, datetime(2030, 1, 1), datetime(2031, 6, 1)),
+            ('ASG-B', 8.0, 0.0, datetime(2030, 1, 2), datetime(2031, 1, 1)),
+            ('ASG-C', 20.0, 15.0, datetime(2030, 1, 3), datetime(2030, 12, 1)),
+        ]
+        cls.lot = {}
+        for name, qty, reserved, in_date, expiry in spec:
+            extra = {'expiration_date': expiry} if cls.has_expiry else {}
+            lot = cls._lot(cls.component, name, **extra)
+            Quant._update_available_quantity(
+                cls.component, cls.stock_location, qty,
+                reserved_quantity=reserved, lot_id=lot, in_date=in_date,
+            )
+            cls.lot[name] = lot.id
+        # Disponible: A 6, B 8, C 5
+
+    def _allocate(self, qty, policy):
+        res = self.api.auto_allocate_lots(
+            self.warehouse.id, [{'product_id': self.component.id, 'qty_real': qty}], policy=policy,
+        )
+        return res['assigned_lots'][self.component.id], res['shortages'].get(self.component.id)
+
+    def test_fifo_uses_available_after_reservations(self):
+        assigned, shortage = self._allocate(9.0, 'fifo')
+        self.assertEqual(assigned, {self.lot['ASG-A']: 6.0, self.lot['ASG-B']: 3.0})
+        self.assertFalse(shortage)
+
+    def test_fefo(self):
+        assigned, shortage = self._allocate(9.0, 'fefo')
+        if self.has_expiry:
+            self.assertEqual(assigned, {self.lot['ASG-C']: 5.0, self.lot['ASG-B']: 4.0})
+        else:
+            # Sin caducidades se desempata por fecha de entrada
+            self.assertEqual(assigned, {self.lot['ASG-A']: 6.0, self.lot['ASG-B']: 3.0})
+        self.assertFalse(shortage)
+
+    def test_fewest_lots(self):
+        # Solo B cubre 7 con lo no reservado (A tiene 10 en fisico, 6 libres)
+        assigned, shortage = self._allocate(7.0, 'fewest')
+        self.assertEqual(assigned, {self.lot['ASG-B']: 7.0})
+        self.assertFalse(shortage)
+        # Ninguno cubre 12: los mas grandes primero
+        assigned, shortage = self._allocate(12.0, 'fewest')
+        self.assertEqual(assigned, {self.lot['ASG-B']: 8.0, self.lot['ASG-A']: 4.0})
+        self.assertFalse(shortage)
+
+    def test_shortfall(self):
+        for policy in ('fefo', 'fifo', 'fewest'):
+            assigned, shortage = self._allocate(30.0, policy)
+            self.assertEqual(sum(assigned.values()), 19.0, policy)
+            self.assertEqual(shortage, 11.0, policy)
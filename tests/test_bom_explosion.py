@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import SimplifiedMrpCase
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpBomExplosion(SimplifiedMrpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # top -> (parent_1 x1, parent_2 x2); ambos usan el mismo sub-ensamble
+        # parent_1 -> (shared x1, loose x1); parent_2 -> (shared x2)
+        # shared -> (leaf x3)
+        cls.top = cls._product('SMRP Explosion Superior', tracking='none')
+        cls.parent_1 = cls._product('SMRP Explosion Padre 1', tracking='none')
+        cls.parent_2 = cls._product('SMRP Explosion Padre 2', tracking='none')
+        cls.shared = cls._product('SMRP Explosion Compartido', tracking='none')
+        cls.loose = cls._product('SMRP Explosion Suelto', tracking='none')
+        cls.leaf = cls._product('SMRP Explosion Hoja', tracking='none')
+        cls._bom(cls.top, [(cls.parent_1, 1.0), (cls.parent_2, 2.0)])
+        cls._bom(cls.parent_1, [(cls.shared, 1.0), (cls.loose, 1.0)])
+        cls._bom(cls.parent_2, [(cls.shared, 2.0)])
+        cls._bom(cls.shared, [(cls.leaf, 3.0)])
+
+    def _quantities(self, res):
+        return {c['product_id']: c['qty_formula'] for c in res['components']}
+
+    def test_shared_sub_bom(self):
+        res = self.api.explode_bom(self.top.id, qty=2.0)
+        self.assertTrue(res['bom_exists'])
+        self.assertFalse(res['truncated'])
+        self.assertEqual(res['levels'], 3)
+        # leaf = 3 * (1*1 + 2*2) por unidad, loose = 1 por unidad
+        self.assertEqual(self._quantities(res), {self.leaf.id: 30.0, self.loose.id: 2.0})
+
+    def test_truncation_flag(self):
+        res = self.api.explode_bom(self.top.id, qty=1.0, levels=2)
+        self.assertTrue(res['truncated'])
+        self.assertEqual(res['levels'], 2)
+        # El sub-ensamble compartido queda como hoja al alcanzar el limite
+        self.assertEqual(self._quantities(res), {self.shared.id: 5.0, self.loose.id: 1.0})
+
+        # Un sub-arbol explotado completo no se marca como truncado
+        res = self.api.explode_bom(self.parent_2.id, qty=1.0, levels=2)
+        self.assertFalse(res['truncated'])
+        self.assertEqual(self._quantities(res), {self.leaf.id: 6.0})
+
+    def test_deep_cycle_rejected(self):
+        # a -> b -> c; crear la BOM de c con a cierra un ciclo de tres niveles
+        a, b, c = (self._product('SMRP Ciclo %s' % n, tracking='none') for n in 'ABC')
+        self._bom(a, [(b, 1.0)])
+        self._bom(b, [(c, 1.0)])
+        with self.assertRaisesRegex(UserError, 'ciclo'):
+            self.api._validate_no_bom_cycle(c, [{'product_id': a.id, 'qty': 1.0}])
+        # Sin ciclo no hay error
+        self.api._validate_no_bom_cycle(c, [{'product_id': self.leaf.id, 'qty': 1.0}])
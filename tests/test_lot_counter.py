@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests import tagged
+
+from .common import SimplifiedMrpCase
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpLotCounter(SimplifiedMrpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Counter = cls.env['simplified.mrp.lot.counter']
+        cls.company = cls.env.company
+        cls.day = date(2030, 1, 15)
+        cls.component = cls._product('SMRP Contador Componente', 'SMRPCNTC')
+        cls.comp_lot = cls._lot(cls.component, 'SMRP-CNT-C-1', qty=100.0)
+        cls.finished = cls._product('SMRP Contador Terminado', 'SMRPCNTF')
+        cls._bom(cls.finished, [(cls.component, 1.0)])
+
+    def test_reserve_only_increases(self):
+        prefix = self.api._lot_prefix(self.finished, self.day)
+        first = self.Counter._reserve(self.finished, self.company, self.day, prefix)
+        block = self.Counter._reserve(self.finished, self.company, self.day, prefix, count=3)
+        last = self.Counter._reserve(self.finished, self.company, self.day, prefix)
+        self.assertEqual(block, first + 1)
+        self.assertEqual(last, block + 3)
+        # Otro dia lleva su propio consecutivo
+        other_day = date(2030, 1, 16)
+        other_prefix = self.api._lot_prefix(self.finished, other_day)
+        self.assertEqual(self.Counter._reserve(self.finished, self.company, other_day, other_prefix), 1)
+
+    def test_reserve_seeds_from_largest_suffix(self):
+        prefix = self.api._lot_prefix(self.finished, self.day)
+        for name in ('%s005' % prefix, '%s012' % prefix, '%sABC' % prefix, 'OTRO-099'):
+            self._lot(self.finished, name)
+        self.assertEqual(self.Counter._reserve(self.finished, self.company, self.day, prefix), 13)
+
+    def _payload(self, lots=None):
+        return {
+            'warehouse_id': self.warehouse.id,
+            'product_id': self.finished.id,
+            'product_qty': 1.0,
+            'components': [{
+                'product_id': self.component.id,
+                'qty': 1.0,
+                'selected_lots': [{'lot_id': (lots or self.comp_lot).id, 'qty': 1.0}],
+            }],
+            'origin': 'SMRP contador',
+            'deferred_completion': False,
+        }
+
+    def test_batch_reservation_is_consecutive(self):
+        shared = {}
+        self.api._reserve_lot_numbers([self._payload() for _i in range(4)], shared)
+        today = next(iter(shared['lot_numbers']))[2]
+        pool = shared['lot_numbers'][(self.finished.id, self.warehouse.company_id.id, today)]
+        self.assertEqual(len(pool), 4)
+        self.assertEqual(pool, list(range(pool[0], pool[0] + 4)))
+        prefix = self.api._lot_prefix(self.finished, today)
+        self.assertEqual(len({f"{prefix}{n:03d}" for n in pool}), 4)
+
+    def test_batch_with_failing_item(self):
+        self.env['ir.config_parameter'].sudo().set_param('aq_simplified_mrp.auto_lot', 'True')
+        foreign_lot = self._lot(self._product('SMRP Contador Ajeno', 'SMRPCNTX'), 'SMRP-CNT-X-1')
+        results = self.api.create_mo_batch([
+            self._payload(),
+            # El lote no pertenece al componente: falla dentro de su savepoint
+            self._payload(lots=foreign_lot),
+            self._payload(),
+        ])
+        self.assertEqual([r['success'] for r in results], [True, False, True])
+        self.assertTrue(results[1]['errors'])
+        mos = self.env['mrp.production'].browse([r['mo_id'] for r in results if r['success']])
+        self.assertEqual(len(mos), 2)
+        names = mos.mapped('lot_producing_id.name')
+        self.assertEqual(len(set(names)), 2)
+        self.assertFalse(self.env['mrp.production'].search_count([
+            ('origin', '=', 'SMRP contador'), ('id', 'not in', mos.ids),
+        ]))
+        # El numero del item revertido queda como hueco, nunca se reutiliza
+        suffixes = sorted(int(name[-3:]) for name in names)
+        self.assertEqual(suffixes[1] - suffixes[0], 2)
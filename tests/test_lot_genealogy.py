@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import SimplifiedMrpCase
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpLotGenealogy(SimplifiedMrpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Genealogy = cls.env['simplified.mrp.lot.genealogy']
+        # raw -> intermediate -> final, cada nivel con su propia MO
+        cls.raw = cls._product('SMRP Genealogia Materia Prima', 'SMRPGENR')
+        cls.intermediate = cls._product('SMRP Genealogia Intermedio', 'SMRPGENI')
+        cls.final = cls._product('SMRP Genealogia Final', 'SMRPGENF')
+        cls._bom(cls.intermediate, [(cls.raw, 2.0)])
+        cls._bom(cls.final, [(cls.intermediate, 1.0)])
+        cls.raw_lot = cls._lot(cls.raw, 'SMRP-GEN-R-1', qty=100.0)
+
+        cls.mo_intermediate = cls._produce(cls.intermediate, cls.raw, cls.raw_lot, 2.0)
+        cls.intermediate_lot = cls.mo_intermediate.lot_producing_id
+        cls.mo_final = cls._produce(cls.final, cls.intermediate, cls.intermediate_lot, 1.0)
+        cls.final_lot = cls.mo_final.lot_producing_id
+
+    @classmethod
+    def _produce(cls, product, component, lot, qty):
+        res = cls.api.create_mo({
+            'warehouse_id': cls.warehouse.id,
+            'product_id': product.id,
+            'product_qty': 1.0,
+            'components': [{
+                'product_id': component.id,
+                'qty': qty,
+                'selected_lots': [{'lot_id': lot.id, 'qty': qty}],
+            }],
+            'origin': 'SMRP genealogia',
+            'deferred_completion': False,
+        })
+        mo = cls.env['mrp.production'].browse(res['mo_id'])
+        assert res['completed'] and mo.lot_producing_id, res
+        return mo
+
+    def _links(self, rows):
+        return [(r['depth'], r['finished_lot_id'], r['component_lot_id']) for r in rows]
+
+    def test_backward_trace_two_levels(self):
+        rows = self.Genealogy._trace(self.final_lot.id, 'backward')
+        self.assertEqual(self._links(rows), [
+            (1, self.final_lot.id, self.intermediate_lot.id),
+            (2, self.intermediate_lot.id, self.raw_lot.id),
+        ])
+        self.assertEqual(rows[1]['qty'], 2.0)
+        # La profundidad maxima corta la recursion
+        self.assertEqual(len(self.Genealogy._trace(self.final_lot.id, 'backward', max_depth=1)), 1)
+
+    def test_forward_trace_two_levels(self):
+        rows = self.Genealogy._trace(self.raw_lot.id, 'forward')
+        self.assertEqual(self._links(rows), [
+            (1, self.intermediate_lot.id, self.raw_lot.id),
+            (2, self.final_lot.id, self.intermediate_lot.id),
+        ])
+
+    def test_record_twice_is_idempotent(self):
+        productions = self.mo_intermediate | self.mo_final
+        domain = [('production_id', 'in', productions.ids)]
+        before = self.Genealogy.search_read(domain, ['id', 'qty'], order='id')
+        self.assertEqual(len(before), 2)
+        self.Genealogy._record_productions(productions.ids)
+        self.Genealogy._record_productions(productions.ids)
+        self.Genealogy.invalidate_model()
+        self.assertEqual(self.Genealogy.search_read(domain, ['id', 'qty'], order='id'), before)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import SimplifiedMrpCase
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpLotPaging(SimplifiedMrpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.bin = cls.env['stock.location'].create({
+            'name': 'SMRP-PAGING-BIN',
+            'usage': 'internal',
+            'location_id': cls.stock_location.id,
+        })
+        cls.component = cls._product('SMRP Paginado Componente', 'SMRPPAG')
+        # Nombres fuera de orden de creacion; uno repartido en dos ubicaciones
+        cls.lots = cls.env['stock.lot']
+        for name in ('PAG-05', 'PAG-01', 'PAG-04', 'PAG-02', 'PAG-03'):
+            cls.lots |= cls._lot(cls.component, name, qty=10.0)
+        cls.env['stock.quant']._update_available_quantity(
+            cls.component, cls.bin, 5.0, lot_id=cls.lots.filtered(lambda l: l.name == 'PAG-03'),
+        )
+        # Stock sin lote: siempre la ultima fila
+        cls.env['stock.quant']._update_available_quantity(cls.component, cls.stock_location, 7.0)
+        cls.expected = [lot.id for lot in cls.lots.sorted('name')] + [-1]
+
+    def _walk(self, limit):
+        seen, pages = [], 0
+        cursor = None
+        while True:
+            page = self.api.get_lots_page(self.component.id, self.warehouse.id, limit=limit, cursor=cursor)
+            self.assertLessEqual(len(page['lots']), limit)
+            seen += [row['id'] for row in page['lots']]
+            pages += 1
+            cursor = page['next_cursor']
+            if not cursor:
+                return seen, pages
+            self.assertLess(pages, 10, 'el cursor no avanza')
+
+    def test_pages_cover_every_row_once(self):
+        for limit in (1, 2, 3, 4, 7):
+            seen, _pages = self._walk(limit)
+            self.assertEqual(seen, self.expected, 'limit=%s' % limit)
+
+    def test_boundary_on_row_without_lot(self):
+        # La pagina llena termina en el ultimo lote: la fila sin lote queda sola
+        first = self.api.get_lots_page(self.component.id, self.warehouse.id, limit=5)
+        self.assertEqual([row['id'] for row in first['lots']], self.expected[:5])
+        self.assertEqual(first['next_cursor']['lot_id'], self.expected[4])
+        second = self.api.get_lots_page(
+            self.component.id, self.warehouse.id, limit=5, cursor=first['next_cursor'],
+        )
+        self.assertEqual([row['id'] for row in second['lots']], [-1])
+        self.assertEqual(second['lots'][0]['qty_available'], 7.0)
+        self.assertFalse(second['next_cursor'])
+
+        # La pagina termina justo en la fila sin lote: no hay cursor siguiente
+        whole = self.api.get_lots_page(self.component.id, self.warehouse.id, limit=6)
+        self.assertEqual([row['id'] for row in whole['lots']], self.expected)
+        self.assertFalse(whole['next_cursor'])
+
+    def test_lot_across_locations_is_aggregated(self):
+        rows = self.api.get_lots_page(self.component.id, self.warehouse.id, limit=10)['lots']
+        by_name = {row['name']: row['qty_available'] for row in rows}
+        self.assertEqual(by_name['PAG-03'], 15.0)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks reproducibles de los endpoints de aq.simplified.mrp.api.
+
+Ejecutar con:
+    odoo-bin -d <db> -i aq_simplified_mrp --test-tags /aq_simplified_mrp:smrp_perf
+
+Volumen de datos (variables de entorno, valores por defecto entre parentesis):
+    SMRP_BENCH_PRODUCTS (50)   productos terminados, cada uno con BOM
+    SMRP_BENCH_BOM_LINES (10)  lineas por BOM
+    SMRP_BENCH_LOTS (5)        lotes por componente
+    SMRP_BENCH_BINS (4)        ubicaciones internas entre las que se reparten los lotes
+    SMRP_BENCH_HISTORY (5)     producciones previas
+
+Presupuestos: SMRP_BENCH_BUDGET_<ENDPOINT>_QUERIES y SMRP_BENCH_BUDGET_<ENDPOINT>_MS
+(por ejemplo SMRP_BENCH_BUDGET_GET_LOTS_QUERIES=8) sobrescriben DEFAULT_BUDGETS.
+"""
+import logging
+import os
+import time
+
+from odoo.tests import TransactionCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+# endpoint: (max consultas SQL, max milisegundos)
+DEFAULT_BUDGETS = {
+    'get_finished_products': (15, 2000),
+    'search_components': (15, 2000),
+    'get_lots': (10, 2000),
+    'get_bom_components': (20, 2000),
+    'create_mo': (250, 5000),
+    'get_my_productions': (15, 2000),
+    'get_production_detail': (30, 2000),
+}
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@tagged('post_install', '-at_install', 'smrp_perf')
+class TestSimplifiedMrpPerformance(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.n_products = _env_int('SMRP_BENCH_PRODUCTS', 50)
+        cls.n_bom_lines = _env_int('SMRP_BENCH_BOM_LINES', 10)
+        cls.n_lots = _env_int('SMRP_BENCH_LOTS', 5)
+        cls.n_bins = _env_int('SMRP_BENCH_BINS', 4)
+        cls.n_history = _env_int('SMRP_BENCH_HISTORY', 5)
+
+        cls.api = cls.env['aq.simplified.mrp.api']
+        cls.warehouse = cls.env.ref('stock.warehouse0')
+        cls.bins = cls.env['stock.location'].create([{
+            'name': 'SMRP-BENCH-%03d' % i,
+            'usage': 'internal',
+            'location_id': cls.warehouse.lot_stock_id.id,
+        } for i in range(cls.n_bins)])
+
+        Product = cls.env['product.product']
+        storable = {'is_storable': True} if 'is_storable' in Product._fields else {}
+        cls.components = Product.create([dict(storable, **{
+            'name': 'SMRP Bench Componente %03d' % i,
+            'default_code': 'SMRPC%03d' % i,
+            'type': 'consu',
+            'tracking': 'lot',
+        }) for i in range(cls.n_bom_lines)])
+        cls.finished = Product.create([dict(storable, **{
+            'name': 'SMRP Bench Terminado %03d' % i,
+            'default_code': 'SMRPF%03d' % i,
+            'type': 'consu',
+            'tracking': 'lot',
+        }) for i in range(cls.n_products)])
+
+        cls.env['mrp.bom'].create([{
+            'product_tmpl_id': fp.product_tmpl_id.id,
+            'product_id': fp.id,
+            'product_qty': 1.0,
+            'bom_line_ids': [(0, 0, {
+                'product_id': comp.id,
+                'product_qty': 1.0,
+                'product_uom_id': comp.uom_id.id,
+            }) for comp in cls.components],
+        } for fp in cls.finished])
+
+        Quant = cls.env['stock.quant']
+        for comp in cls.components:
+            lots = cls.env['stock.lot'].create([{
+                'name': 'SMRP-%s-%03d' % (comp.default_code, i),
+                'product_id': comp.id,
+                'company_id': cls.env.company.id,
+            } for i in range(cls.n_lots)])
+            for i, lot in enumerate(lots):
+                location = cls.bins[i % len(cls.bins)] if cls.bins else cls.warehouse.lot_stock_id
+                Quant._update_available_quantity(comp, location, 1000.0, lot_id=lot)
+
+        cls.productions = cls.env['mrp.production']
+        for i in range(cls.n_history):
+            res = cls.api.create_mo(cls._build_payload(cls.finished[i % len(cls.finished)]))
+            cls.productions |= cls.env['mrp.production'].browse(res['mo_id'])
+
+    @classmethod
+    def _build_payload(cls, product, qty=1.0):
+        components = []
+        for comp in cls.components:
+            lots = cls.api.get_lots(comp.id, cls.warehouse.id, limit=1)
+            components.append({
+                'product_id': comp.id,
+                'qty': qty,
+                'selected_lots': [{'lot_id': lots[0]['id'], 'qty': qty}] if lots else [],
+            })
+        return {
+            'warehouse_id': cls.warehouse.id,
+            'product_id': product.id,
+            'product_qty': qty,
+            'components': components,
+            'origin': 'SMRP bench',
+            'deferred_completion': False,
+        }
+
+    def _budget(self, endpoint):
+        queries, ms = DEFAULT_BUDGETS[endpoint]
+        key = 'SMRP_BENCH_BUDGET_%s' % endpoint.upper()
+        return _env_int(key + '_QUERIES', queries), _env_int(key + '_MS', ms)
+
+    def _bench(self, endpoint, method, *args, **kwargs):
+        """Ejecuta un endpoint en frio y falla si excede su presupuesto."""
+        max_queries, max_ms = self._budget(endpoint)
+        self.env.flush_all()
+        self.env.invalidate_all()
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        started = time.perf_counter()
+        result = getattr(self.api, method)(*args, **kwargs)
+        self.env.flush_all()
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        query_count = cr.sql_log_count - queries
+        _logger.info("SMRP bench %s: %.1f ms, %s consultas", endpoint, elapsed_ms, query_count)
+        self.assertLessEqual(
+            query_count, max_queries,
+            "%s excedio el presupuesto de consultas: %s > %s" % (endpoint, query_count, max_queries),
+        )
+        self.assertLessEqual(
+            elapsed_ms, max_ms,
+            "%s excedio el presupuesto de tiempo: %.1f ms > %s ms" % (endpoint, elapsed_ms, max_ms),
+        )
+        return result
+
+    def test_get_finished_products(self):
+        # El prefijo de codigo SMRPF solo coincide con terminados (todos con BOM)
+        res = self._bench('get_finished_products', 'get_finished_products', 'SMRPF', 20)
+        self.assertTrue(res)
+        self.assertTrue(all(p['has_bom'] for p in res))
+
+    def test_search_components(self):
+        res = self._bench('search_components', 'search_components', 'SMRPC', 20)
+        self.assertTrue(res)
+
+    def test_get_lots(self):
+        res = self._bench('get_lots', 'get_lots', self.components[0].id, self.warehouse.id, 60)
+        self.assertEqual(len(res), min(self.n_lots, 60))
+
+    def test_get_bom_components(self):
+        res = self._bench('get_bom_components', 'get_bom_components', self.finished[0].id, 2.0)
+        self.assertTrue(res['bom_exists'])
+        self.assertEqual(len(res['components']), self.n_bom_lines)
+
+    def test_create_mo(self):
+        payload = self._build_payload(self.finished[-1])
+        res = self._bench('create_mo', 'create_mo', payload)
+        self.assertTrue(res['mo_id'])
+
+    def test_get_my_productions(self):
+        res = self._bench('get_my_productions', 'get_my_productions', 50)
+        self.assertGreaterEqual(len(res), len(self.productions))
+
+    def test_get_production_detail(self):
+        if not self.productions:
+            self.skipTest('SMRP_BENCH_HISTORY=0: sin producciones previas')
+        res = self._bench('get_production_detail', 'get_production_detail', self.productions[0].id)
+        self.assertEqual(len(res['components']), self.n_bom_lines)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpSession(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Session = cls.env['simplified.mrp.session']
+        Product = cls.env['product.product']
+        storable = {'is_storable': True} if 'is_storable' in Product._fields else {}
+        cls.comp_a, cls.comp_b, cls.comp_c = Product.create([dict(storable, **{
+            'name': 'SMRP Sesion Componente %s' % code,
+            'type': 'consu',
+            'tracking': 'lot',
+        }) for code in 'ABC'])
+        cls.lot_a1, cls.lot_a2 = cls.env['stock.lot'].create([{
+            'name': 'SMRP-SES-A-%s' % i,
+            'product_id': cls.comp_a.id,
+            'company_id': cls.env.company.id,
+        } for i in (1, 2)])
+
+    def _component(self, product, qty):
+        return {
+            'product_id': product.id,
+            'uom_id': product.uom_id.id,
+            'qty_formula': qty,
+            'qty_real': qty,
+        }
+
+    def _save_draft(self):
+        return self.Session.save_session({
+            'current_step': 'components',
+            'components': [self._component(self.comp_a, 1.0), self._component(self.comp_b, 2.0)],
+            'assigned_lots': {str(self.comp_a.id): {str(self.lot_a1.id): 1.0}},
+        })
+
+    def test_save_load_round_trip(self):
+        payload = {
+            'product_qty': 4.0,
+            'origin': 'OV-RT',
+            'current_step': 'lots',
+            'components': [self._component(self.comp_a, 1.0), self._component(self.comp_b, 2.0)],
+            'byproducts': [{'product_id': self.comp_c.id, 'uom_id': self.comp_c.uom_id.id, 'qty': 0.5}],
+            'assigned_lots': {
+                str(self.comp_a.id): {str(self.lot_a1.id): 0.75, str(self.lot_a2.id): 0.25},
+                str(self.comp_b.id): {'-1': 2.0},
+            },
+        }
+        saved = self.Session.save_session(payload)
+        data = self.Session.load_session()
+        self.assertEqual(data['session_id'], saved['session_id'])
+        self.assertEqual((data['product_qty'], data['origin'], data['current_step']), (4.0, 'OV-RT', 'lots'))
+        self.assertEqual(
+            [(c['product_id'], c['qty_formula'], c['qty_real']) for c in data['components']],
+            [(self.comp_a.id, 1.0, 1.0), (self.comp_b.id, 2.0, 2.0)],
+        )
+        self.assertEqual([(b['product_id'], b['qty']) for b in data['byproducts']], [(self.comp_c.id, 0.5)])
+        self.assertEqual(data['assigned_lots'], payload['assigned_lots'])
+
+        # Guardar lo mismo no escribe ni cambia la version
+        self.assertEqual(self.Session.save_session(payload)['version'], saved['version'])
+
+        payload.update(
+            components=[self._component(self.comp_b, 3.0)],
+            assigned_lots={str(self.comp_b.id): {'-1': 3.0}},
+        )
+        resaved = self.Session.save_session(payload)
+        self.assertEqual(resaved['version'], saved['version'] + 1)
+        data = self.Session.load_session()
+        self.assertEqual([(c['product_id'], c['qty_real']) for c in data['components']], [(self.comp_b.id, 3.0)])
+        self.assertEqual(data['assigned_lots'], payload['assigned_lots'])
+        session = self.Session.browse(saved['session_id'])
+        self.assertEqual(len(session.component_ids), 1)
+        self.assertEqual(len(session.lot_line_ids), 1)
+
+    def test_patch_version_conflict(self):
+        saved = self._save_draft()
+        res = self.Session.patch_session(saved['session_id'], saved['version'], {'origin': 'OV-1'})
+        self.assertFalse(res['conflict'])
+        self.assertEqual(res['version'], saved['version'] + 1)
+
+        stale = self.Session.patch_session(saved['session_id'], saved['version'], {'origin': 'OV-2'})
+        self.assertTrue(stale['found'])
+        self.assertTrue(stale['conflict'])
+        self.assertEqual(stale['version'], res['version'])
+        self.assertEqual(self.Session.load_session()['origin'], 'OV-1')
+
+    def test_patch_ops(self):
+        saved = self._save_draft()
+        pid_a, lot_1, lot_2 = str(self.comp_a.id), str(self.lot_a1.id), str(self.lot_a2.id)
+        res = self.Session.patch_session(saved['session_id'], saved['version'], {'ops': [
+            {'op': 'add', 'path': '/components/-', 'value': self._component(self.comp_c, 3.0)},
+            {'op': 'replace', 'path': '/components/0/qty_real', 'value': 1.5},
+            {'op': 'remove', 'path': '/components/1'},
+            {'op': 'add', 'path': '/assigned_lots/%s/%s' % (pid_a, lot_2), 'value': 0.5},
+            {'op': 'replace', 'path': '/assigned_lots/%s/%s' % (pid_a, lot_1), 'value': 1.0},
+        ]})
+        self.assertFalse(res['conflict'])
+        data = self.Session.load_session()
+        self.assertEqual([c['product_id'] for c in data['components']], [self.comp_a.id, self.comp_c.id])
+        self.assertEqual(data['components'][0]['qty_real'], 1.5)
+        self.assertEqual(data['assigned_lots'], {pid_a: {lot_1: 1.0, lot_2: 0.5}})
+
+        self.Session.patch_session(saved['session_id'], res['version'], {'ops': [
+            {'op': 'remove', 'path': '/assigned_lots/%s' % pid_a},
+        ]})
+        self.assertEqual(self.Session.load_session()['assigned_lots'], {})
+
+    def test_patch_invalid_ops(self):
+        saved = self._save_draft()
+        for op in (
+            {'op': 'replace', 'path': '/components/-1', 'value': {}},
+            {'op': 'remove', 'path': '/components/9'},
+            {'op': 'move', 'path': '/components/0'},
+            {'op': 'add', 'path': '/unknown/0', 'value': {}},
+            {'op': 'replace', 'path': '/assigned_lots/%s' % self.comp_a.id, 'value': [1]},
+        ):
+            with self.assertRaises(UserError):
+                self.Session.patch_session(saved['session_id'], saved['version'], {'ops': [op]})
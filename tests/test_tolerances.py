@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import SimplifiedMrpCase
+
+
+@tagged('post_install', '-at_install')
+class TestSimplifiedMrpTolerances(SimplifiedMrpCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.comp_a = cls._product('SMRP Tolerancia A', tracking='none')
+        cls.comp_b = cls._product('SMRP Tolerancia B', tracking='none')
+        cls.finished = cls._product('SMRP Tolerancia Terminado', tracking='none')
+        cls.bom = cls._bom(cls.finished, [(cls.comp_a, 1.0), (cls.comp_b, 1.0)])
+        cls.config = dict(cls.api._get_mrp_config_cached(), allow_confirm_red=False, tolerance_orange=25.0)
+
+    def _check(self, real, declared):
+        comps = [{'product_id': p.id, 'qty': q, 'lots': []} for p, q in real if q > 0]
+        self.api._check_tolerances(self.bom, 2.0, comps, self.config, {p.id for p in declared})
+
+    def test_omitted_component_is_not_critical(self):
+        # Como en el cliente: sin linea en el payload se consume lo planeado
+        self._check([(self.comp_a, 2.0)], [self.comp_a])
+
+    def test_zero_or_deviated_component_is_critical(self):
+        with self.assertRaises(UserError):
+            self._check([(self.comp_a, 2.0), (self.comp_b, 0.0)], [self.comp_a, self.comp_b])
+        with self.assertRaises(UserError):
+            self._check([(self.comp_a, 3.0)], [self.comp_a])
+        self._check([(self.comp_a, 2.2), (self.comp_b, 1.8)], [self.comp_a, self.comp_b])